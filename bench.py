@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Замеры для bot.py на синтетических голосах.
+
+    python bench.py memory --voters 1000000
+    python bench.py keyboards
+    python bench.py callbacks
+    python bench.py generate --voters 100000 --out votes.json
+    python bench.py suite --sizes 1000,100000,1000000 --out bench.json
+    python bench.py export --sizes 100000,1000000
+    python bench.py roundtrip --voters 5000
+
+Время сборки в memory замеряется под tracemalloc и поэтому завышено.
+suite замеряет каждую операцию дважды: время и CPU — без tracemalloc,
+пик памяти — отдельным проходом под ним (--no-memory пропускает второй).
+"""
+
+import argparse, io, json, os, platform, random, shutil, sys, tempfile, time, tracemalloc
+from datetime import datetime, timezone
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, CommandHandler
+
+import bot
+
+# Замеряем на конкурсе по умолчанию; его хранилище не открывается
+SPEC       = bot.load(bot.CONTESTS.path(bot.DEFAULT_CONTEST))
+CATEGORIES = SPEC["categories"]
+
+
+def synth_entry(rng, i, weights):
+    """Один бюллетень: фавориты категорий выбираются чаще остальных."""
+    preds, wishes = {}, {}
+    for cat, w in zip(CATEGORIES, weights):
+        preds[cat["id"]]  = rng.choices(cat["options"], w)[0]
+        wishes[cat["id"]] = rng.choice(cat["options"])
+    return {"name": f"User {i}", "username": f"user{i}" if i % 3 else "",
+            "predictions": preds, "wishes": wishes, "completed": rng.random() < 0.97}
+
+def synth_votes(n, seed=1):
+    """(uid, entry) для n участников, воспроизводимо по seed."""
+    rng     = random.Random(seed)
+    weights = [[1 / (k + 1) ** 1.2 for k in range(len(c["options"]))] for c in CATEGORIES]
+    for w in weights:
+        rng.shuffle(w)
+    for i in range(n):
+        yield str(100_000_000 + i), synth_entry(rng, i, weights)
+
+
+def measure(build):
+    tracemalloc.start()
+    t0  = time.perf_counter()
+    obj = build()
+    dt  = time.perf_counter() - t0
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size, dt
+
+
+def bench_memory(args):
+    n = args.voters
+    votes, dict_bytes, dict_s = measure(lambda: dict(synth_votes(n)))
+    ballots, b_bytes, b_s = measure(lambda v=votes: bot.Ballots.from_votes(CATEGORIES, v))
+    del votes
+    winners = bot.array("b", [0] * ballots.width)
+    t0 = time.perf_counter()
+    ballots.score_all(winners)
+    score_s = time.perf_counter() - t0
+    print(f"voters            {n}")
+    print(f"numpy             {'yes' if bot.np is not None else 'no'}")
+    print(f"dict (votes.json) {dict_bytes / 2**20:9.1f} MiB  build {dict_s:.2f}s")
+    print(f"Ballots total     {b_bytes / 2**20:9.1f} MiB  build {b_s:.2f}s")
+    print(f"  int8 matrix     {ballots.nbytes() / 2**20:9.1f} MiB")
+    print(f"score_all         {score_s * 1000:9.1f} ms")
+
+
+def _step_fresh(c, i):
+    # Как было до кэша: клавиатуры и заголовки собираются на каждом шаге
+    opt = c.categories[i]["options"][0]
+    return (bot._header(c, i) + "★  " + c.question, bot._build_keyboard(c, i, "predict"),
+            bot._wish_text(c, i, opt), bot._build_keyboard(c, i, "wish"))
+
+def _step_cached(c, i):
+    return (c.predict_texts[i], c.keyboards[i, "predict"],
+            c.wish_texts[i][0], c.keyboards[i, "wish"])
+
+def bench_keyboards(args):
+    c = bot.Contest(bot.DEFAULT_CONTEST, SPEC)
+    for label, step in (("fresh", _step_fresh), ("cached", _step_cached)):
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            for i in range(c.total):
+                step(c, i)
+        per_step = (time.perf_counter() - t0) / (args.rounds * c.total * 2)
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        for i in range(c.total):
+            step(c, i)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:7} {per_step * 1e6:8.2f} µs/шаг   пик аллокаций за {2 * c.total} шагов {peak / 1024:8.1f} KiB")
+
+
+async def _noop(update, ctx):
+    pass
+
+# Как кнопки разбирались до CallbackRouter: цепочка регулярок на каждое
+# состояние (точки входа проверяются первыми — allow_reentry), затем split
+_LEGACY_ENTRY = [CommandHandler("start", _noop),
+                 CallbackQueryHandler(_noop, pattern=r"^revote$"),
+                 CallbackQueryHandler(_noop, pattern=r"^showvotes$")]
+_LEGACY = {
+    bot.PREDICT: _LEGACY_ENTRY + [CallbackQueryHandler(_noop, pattern=r"^predict_\d+_\d+$"),
+                                  CallbackQueryHandler(_noop, pattern=r"^back_predict_\d+$"),
+                                  CallbackQueryHandler(_noop, pattern=r"^revote$"),
+                                  CallbackQueryHandler(_noop, pattern=r"^showvotes$")],
+    bot.WISH:    _LEGACY_ENTRY + [CallbackQueryHandler(_noop, pattern=r"^wish_\d+_\d+$"),
+                                  CallbackQueryHandler(_noop, pattern=r"^back_wish_\d+$")],
+}
+_ENTRY  = [CommandHandler("start", _noop), bot.CallbackRouter({"r": _noop, "s": _noop})]
+_ROUTED = {
+    bot.PREDICT: _ENTRY + [bot.CallbackRouter({"p": _noop, "b": _noop, "r": _noop, "s": _noop})],
+    bot.WISH:    _ENTRY + [bot.CallbackRouter({"w": _noop, "b": _noop})],
+}
+
+def _legacy_dispatch(state, update):
+    for h in _LEGACY[state]:
+        if h.check_update(update):
+            return tuple(int(x) for x in update.callback_query.data.split("_")[-2:] if x.isdigit())
+
+def _routed_dispatch(state, update):
+    for h in _ROUTED[state]:
+        parsed = h.check_update(update)
+        if parsed:
+            return parsed[2]
+
+def _callback(data):
+    return Update.de_json({"update_id": 1, "callback_query": {
+        "id": "1", "chat_instance": "1", "data": data,
+        "from": {"id": 1, "is_bot": False, "first_name": "U"}}}, None)
+
+def bench_callbacks(args):
+    # Роутер сверяет номера с конкурсом из кнопки; хранилище ему не нужно
+    c = bot.CONTESTS.loaded[bot.DEFAULT_CONTEST] = bot.Contest(bot.DEFAULT_CONTEST, SPEC)
+    # Прохождение опроса: прогноз и пожелание в каждой категории, изредка ← Назад
+    steps = []
+    for i, cat in enumerate(CATEGORIES):
+        k = i % len(cat["options"])
+        steps.append((bot.PREDICT, f"predict_{i}_{k}", bot.cb(c, "p", i, k)))
+        steps.append((bot.WISH,    f"wish_{i}_{k}",    bot.cb(c, "w", i, k)))
+        if i:
+            steps.append((bot.WISH, f"back_wish_{i}",  bot.cb(c, "b", i)))
+    legacy = [(state, _callback(old)) for state, old, _ in steps]
+    routed = [(state, _callback(new)) for state, _, new in steps]
+    # Разбор один и тот же: те же номера категории и варианта
+    assert [_legacy_dispatch(*x) for x in legacy] == [_routed_dispatch(*x) for x in routed]
+    for label, dispatch, updates in (("regex", _legacy_dispatch, legacy), ("router", _routed_dispatch, routed)):
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            for state, update in updates:
+                dispatch(state, update)
+        per = (time.perf_counter() - t0) / (args.rounds * len(updates))
+        print(f"{label:7} {per * 1e6:8.2f} µs/нажатие")
+    stale = [_callback(d) for d in ("predict_0_1", "1p0.1", "2z@oscar", "2p0.x@oscar", "2p0.99@oscar",
+                                     "2p-1.0@oscar", "2p0.1@nope", "")]
+    t0 = time.perf_counter()
+    for _ in range(args.rounds):
+        for update in stale:
+            _routed_dispatch(bot.PREDICT, update)
+    print(f"{'stale':7} {(time.perf_counter() - t0) / (args.rounds * len(stale)) * 1e6:8.2f} µs/нажатие"
+          f"   (устаревшие, битые и вне конкурса, router)")
+    print(f"длина callback_data: до {max(len(old) for _, old, _ in steps)} байт, "
+          f"теперь до {max(len(new) for _, _, new in steps)}")
+
+
+def bench_generate(args):
+    bot.save(args.out, dict(synth_votes(args.voters, args.seed)))
+    print(f"{args.voters} голосов → {args.out} ({os.path.getsize(args.out) / 2**20:.1f} MiB)")
+
+
+def synth_results(seed=1):
+    """Победители: как правило, фаворит — номинант, за которого чаще голосуют."""
+    rng = random.Random(seed)
+    return {c["id"]: rng.choice(c["options"][:2]) for c in CATEGORIES}
+
+def timed(fn, memory):
+    """Замер одной операции: wall и CPU без tracemalloc, пик памяти — вторым проходом."""
+    t0, c0 = time.perf_counter(), time.process_time()
+    fn()
+    row = {"wall_s": time.perf_counter() - t0, "cpu_s": time.process_time() - c0}
+    if memory:
+        tracemalloc.start()
+        fn()
+        row["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return row
+
+def suite_ops(n, workdir, seed):
+    """(имя, функция, число вызовов внутри функции) для n голосов."""
+    votes_path   = os.path.join(workdir, "votes.json")
+    results_path = os.path.join(workdir, "results.json")
+    config_path  = os.path.join(workdir, "config.json")
+    votes   = dict(synth_votes(n, seed))
+    results = synth_results(seed)
+    bot.save(votes_path, votes)
+    bot.save(results_path, results)
+
+    open_store = lambda: bot.VoteStore(CATEGORIES, votes_path, results_path, config_path)
+    store = open_store()
+    store.open()
+    c = bot.Contest(bot.DEFAULT_CONTEST, SPEC)
+    c.store = store                   # _render_* читают хранилище конкурса
+    rng   = random.Random(seed)
+    uids  = rng.sample(store.ballots.uids, min(1000, n))
+
+    def set_results():
+        board = bot.Scoreboard(store.ballots)
+        for cat_id, winner in results.items():
+            board.set_result(cat_id, winner)
+
+    return [
+        ("save",         lambda: bot.save(votes_path, votes), 1),
+        ("load",         lambda: bot.load(votes_path), 1),
+        ("open",         lambda: open_store().open(), 1),
+        ("score",        lambda: bot.Scoreboard(store.ballots, results), 1),
+        ("set_result",   set_results, len(results)),
+        ("leaderboard",  lambda: bot._render_leaderboard(c), 1),
+        ("stats_tally",  store.count_tallies, 1),
+        ("stats_render", lambda: bot._render_stats(c, "голосование закрыто"), 1),
+        ("my_results",   lambda: [bot._render_my_results(c, uid) for uid in uids], len(uids)),
+    ]
+
+def bench_export(args):
+    """Выгрузка в /dev/null: пик памяти не зависит от числа строк."""
+    results = synth_results(args.seed)
+    for n in (int(x) for x in args.sizes.split(",")):
+        ballots = bot.Ballots(CATEGORIES)
+        for uid, entry in synth_votes(n, args.seed):
+            ballots.put(uid, entry)
+        def export():
+            with open(os.devnull, "w", encoding="utf-8") as f:
+                f.writelines(bot.export_lines(bot.export_rows(ballots, results), args.format))
+        row  = timed(export, True)
+        rows = sum(1 for _ in bot.export_rows(ballots, results))
+        print(f"{n:>8} уч. {rows:>9} строк  {row['wall_s']:6.1f} с  {rows / row['wall_s']:>9,.0f} строк/с  "
+              f"пик {row['peak_bytes'] / 1024:7.1f} KiB   (матрица {ballots.nbytes() / 2**20:.1f} MiB)")
+
+
+def bench_roundtrip(args):
+    """Выгрузка → строки вперемешку → загрузка в каждое хранилище → та же выгрузка."""
+    ballots = bot.Ballots(CATEGORIES)
+    for uid, entry in synth_votes(args.voters, args.seed):
+        ballots.put(uid, entry)
+    header, *body = bot.export_lines(bot.export_rows(ballots, {}))
+    # Строки участника разбросаны по файлу, как в выгрузке из другого канала
+    random.Random(args.seed).shuffle(body)
+    text = header + "".join(body)
+    bad  = 0
+    cwd, workdir = os.getcwd(), tempfile.mkdtemp(prefix="oscar-roundtrip-")
+    try:
+        for storage in ("json", "journal", "sqlite"):
+            os.makedirs(os.path.join(workdir, storage))
+            os.chdir(os.path.join(workdir, storage))
+            store = bot.make_store(bot.DEFAULT_CONTEST, CATEGORIES, storage)
+            store.open()
+            groups = store.put_many(bot.import_entries(store, bot.read_rows(io.StringIO(text))))
+            store.close()
+            store = bot.make_store(bot.DEFAULT_CONTEST, CATEGORIES, storage)
+            store.open()
+            same = sorted(bot.export_lines(bot.export_rows(store.ballots, {}))) == sorted([header] + body)
+            store.close()
+            bad += not same
+            print(f"{storage:8} групп строк {groups:>7}  участников {len(store.ballots):>7}  "
+                  f"{'совпадает' if same else 'РАСХОДИТСЯ'}")
+        try:
+            list(bot.import_entries(store, bot.read_rows(io.StringIO(header + "abc,,,1,best_picture,,,\n"))))
+            print("uid не числом принят")
+            bad += 1
+        except ValueError as e:
+            print("uid не числом отклонён:", e)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if bad else 0)
+
+
+def bench_suite(args):
+    sizes = [int(x) for x in args.sizes.split(",")]
+    out = {"meta": {"date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "python": platform.python_version(), "platform": platform.platform(),
+                    "numpy": bot.np.__version__ if bot.np is not None else None,
+                    "seed": args.seed, "memory": not args.no_memory},
+           "results": []}
+    workdir = tempfile.mkdtemp(prefix="oscar-bench-")
+    try:
+        for n in sizes:
+            for op, fn, calls in suite_ops(n, workdir, args.seed):
+                row = {"voters": n, "op": op, "calls": calls, **timed(fn, not args.no_memory)}
+                out["results"].append(row)
+                mem = f"{row['peak_bytes'] / 2**20:9.1f} MiB" if "peak_bytes" in row else ""
+                print(f"{n:>8} {op:13} {row['wall_s'] * 1000:10.1f} ms  cpu {row['cpu_s'] * 1000:10.1f} ms {mem}",
+                      file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    text = json.dumps(out, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def main():
+    ap  = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("memory", help="память dict-голосов против матрицы Ballots")
+    p.add_argument("--voters", type=int, default=100_000)
+    p.set_defaults(func=bench_memory)
+    p = sub.add_parser("keyboards", help="клавиатуры и заголовки: сборка на каждом шаге против кэша")
+    p.add_argument("--rounds", type=int, default=2000)
+    p.set_defaults(func=bench_keyboards)
+    p = sub.add_parser("callbacks", help="разбор нажатий: цепочка регулярок против CallbackRouter")
+    p.add_argument("--rounds", type=int, default=5000)
+    p.set_defaults(func=bench_callbacks)
+    p = sub.add_parser("export", help="потоковая выгрузка CSV/JSONL: время и пик памяти")
+    p.add_argument("--sizes",  default="100000,1000000", help="числа участников через запятую")
+    p.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    p.add_argument("--seed",   type=int, default=1)
+    p.set_defaults(func=bench_export)
+    p = sub.add_parser("roundtrip", help="выгрузка и загрузка вперемешку дают те же данные во всех хранилищах")
+    p.add_argument("--voters", type=int, default=5000)
+    p.add_argument("--seed",   type=int, default=1)
+    p.set_defaults(func=bench_roundtrip)
+    p = sub.add_parser("generate", help="синтетический votes.json")
+    p.add_argument("--voters", type=int, default=100_000)
+    p.add_argument("--seed",   type=int, default=1)
+    p.add_argument("--out",    default="votes.json")
+    p.set_defaults(func=bench_generate)
+    p = sub.add_parser("suite", help="подсчёт, рейтинг, /stats, /my_results и load/save — в JSON")
+    p.add_argument("--sizes", default="1000,100000,1000000", help="числа участников через запятую")
+    p.add_argument("--seed",  type=int, default=1)
+    p.add_argument("--out",   help="куда записать JSON (по умолчанию stdout)")
+    p.add_argument("--no-memory", action="store_true", help="не замерять пик памяти")
+    p.set_defaults(func=bench_suite)
+    args = ap.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -4,54 +4,123 @@ Oscar 2026 · Prediction Bot
 98th Academy Awards · 15 марта 2026
 """
 
-import json, os, logging
+import argparse, asyncio, csv, functools, gzip, io, json, multiprocessing, os, re, signal, sys, secrets, sqlite3
+import tempfile, threading, time, logging
+from array import array
+from bisect import bisect_left
 from datetime import datetime, timezone, timedelta
+from collections import Counter, OrderedDict
+from itertools import islice
+from queue import Empty
+from sortedcontainers import SortedList
+try:
+    import numpy as np
+except ImportError:  # numpy необязателен: без него столбцы матрицы считаются через bytes
+    np = None
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
 from telegram.ext import (
-    Application, CommandHandler, CallbackQueryHandler,
-    ContextTypes, ConversationHandler
+    Application, BaseHandler, CommandHandler, CallbackQueryHandler, TypeHandler,
+    ContextTypes, ConversationHandler, BaseUpdateProcessor, BasePersistence, PersistenceInput
 )
+from telegram.request import HTTPXRequest
+import tornado.httpserver, tornado.web
 
 logging.basicConfig(format="%(asctime)s | %(levelname)s | %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# ── НОМИНАЦИИ ─────────────────────────────────────────────────────────────────
-
-CATEGORIES = [
-    {"id": "best_picture", "title": "Лучший фильм",
-     "options": ["Bugonia","F1","Frankenstein","Hamnet","Marty Supreme",
-                 "One Battle After Another","The Secret Agent","Sentimental Value","Sinners","Train Dreams"]},
-    {"id": "best_director", "title": "Лучшая режиссура",
-     "options": ["Ryan Coogler — Sinners","Paul Thomas Anderson — One Battle After Another",
-                 "Josh Safdie — Marty Supreme","Joachim Trier — Sentimental Value","Chloé Zhao — Hamnet"]},
-    {"id": "best_actor", "title": "Лучший актёр",
-     "options": ["Timothée Chalamet — Marty Supreme","Leonardo DiCaprio — One Battle After Another",
-                 "Ethan Hawke — Blue Moon","Michael B. Jordan — Sinners","Wagner Moura — The Secret Agent"]},
-    {"id": "best_actress", "title": "Лучшая актриса",
-     "options": ["Jessie Buckley — Hamnet","Rose Byrne — If I Had Legs, I'd Kick You",
-                 "Kate Hudson — Song Sung Blue","Renate Reinsve — Sentimental Value","Emma Stone — Bugonia"]},
-    {"id": "best_supporting_actor", "title": "Лучший актёр второго плана",
-     "options": ["Benicio del Toro — One Battle After Another","Miles Caton — Sinners",
-                 "Jacob Elordi — Frankenstein","Delroy Lindo — Sinners","Sean Penn — One Battle After Another"]},
-    {"id": "best_supporting_actress", "title": "Лучшая актриса второго плана",
-     "options": ["Elle Fanning — Sentimental Value","Inga Ibsdotter Lilleaas — Sentimental Value",
-                 "Amy Madigan — Weapons","Wunmi Mosaku — Sinners","Teyana Taylor — One Battle After Another"]},
-    {"id": "best_animated", "title": "Лучший анимационный фильм",
-     "options": ["Arco","Elio","KPop Demon Hunters","Little Amélie or the Character of Rain","Zootopia 2"]},
-    {"id": "best_adapted_screenplay", "title": "Лучший адаптированный сценарий",
-     "options": ["One Battle After Another — Paul Thomas Anderson","Hamnet — Chloé Zhao",
-                 "Frankenstein — Guillermo del Toro et al.","Train Dreams — Clint Bentley",
-                 "The Secret Agent — Paul Thomas Anderson"]},
-]
-
-TOTAL        = len(CATEGORIES)
+# ── КОНКУРСЫ ──────────────────────────────────────────────────────────────────
+
+# Каждый конкурс описан файлом CONTESTS_DIR/<id>.json: название и подписи,
+# номинации, дедлайн по умолчанию. /start <id> — участвовать в конкурсе <id>,
+# без аргумента — в последнем выбранном или в DEFAULT_CONTEST
+CONTESTS_DIR    = os.environ.get("CONTESTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "contests"))
+DEFAULT_CONTEST = os.environ.get("DEFAULT_CONTEST", "oscar")
+ADMIN_IDS       = {int(x) for x in os.environ.get("ADMIN_IDS", "").split(",") if x.strip()}
+
+# Файлы данных конкурса по умолчанию; у остальных — те же имена
+# с суффиксом: votes.bafta.json, oscar.bafta.db
 DATA_FILE    = os.environ.get("DATA_FILE",    "votes.json")
 RESULTS_FILE = os.environ.get("RESULTS_FILE", "results.json")
 CONFIG_FILE  = os.environ.get("CONFIG_FILE",  "config.json")
-ADMIN_IDS    = {int(x) for x in os.environ.get("ADMIN_IDS", "").split(",") if x.strip()}
 
-# Дедлайн по умолчанию: 14 марта 2026, 19:00 МСК = 16:00 UTC
-DEFAULT_DEADLINE = datetime(2026, 3, 14, 16, 0, tzinfo=timezone.utc)
+# Все записи на диск идут через одну фоновую задачу; изменения, накопившиеся,
+# пока шла предыдущая запись, сохраняются вместе — не больше WRITE_BATCH за раз
+WRITE_BATCH = int(os.environ.get("WRITE_BATCH", "500"))
+
+# STORAGE=journal — каждое изменение дописывается в JOURNAL_FILE,
+# а в снимок (DATA_FILE + RESULTS_FILE) журнал сворачивается раз в COMPACT_EVERY записей
+STORAGE       = os.environ.get("STORAGE", "json")
+JOURNAL_FILE  = os.environ.get("JOURNAL_FILE", "votes.jsonl")
+COMPACT_EVERY = int(os.environ.get("COMPACT_EVERY", "5000"))
+
+# STORAGE=sqlite — голоса, результаты и настройки в одной базе (WAL);
+# перенести туда JSON-файлы: python bot.py migrate
+DB_FILE       = os.environ.get("DB_FILE", "oscar.db")
+
+# Незавершённые опросы (ctx.user_data и шаг разговора) переживают рестарт:
+# хранятся в SQLite-файле SESSION_FILE, изменения сбрасываются раз в
+# SESSION_FLUSH сек. и при остановке. Пустой SESSION_FILE — не сохранять
+SESSION_FILE  = os.environ.get("SESSION_FILE", "sessions.db")
+SESSION_FLUSH = float(os.environ.get("SESSION_FLUSH", "5"))
+
+# WORKERS > 1 — обновления делятся по user id между WORKERS процессами-
+# обработчиками с общей базой (только STORAGE=sqlite); голоса и результаты,
+# записанные соседями, подхватываются не реже раза в SYNC_INTERVAL сек.
+WORKERS       = int(os.environ.get("WORKERS", "1"))
+SYNC_INTERVAL = float(os.environ.get("SYNC_INTERVAL", "1"))
+WORKER_INDEX  = 0             # номер этого процесса-обработчика, задаёт run_worker
+
+# Сколько готовых ответов /leaderboard, /stats, /results держать в кэше
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "32"))
+
+# Как часто (сек.) проверять, не поменяли ли настройки снаружи — правкой
+# config.json или из другого процесса
+CONFIG_RECHECK = float(os.environ.get("CONFIG_RECHECK", "5"))
+
+# Сколько обновлений обрабатывать одновременно (обновления одного
+# пользователя всё равно идут строго по очереди) и сколько HTTP-соединений
+# держать для исходящих запросов к Bot API
+CONCURRENT_UPDATES   = int(os.environ.get("CONCURRENT_UPDATES", "64"))
+CONNECTION_POOL_SIZE = int(os.environ.get("CONNECTION_POOL_SIZE", "64"))
+
+# Защита от флуда: на пользователя не больше FLOOD_RATE обновлений в секунду
+# с запасом FLOOD_BURST подряд (0 — без ограничения, админы не ограничиваются).
+# Повторное нажатие той же кнопки того же сообщения в пределах
+# CALLBACK_DEBOUNCE сек. только гасит «часики» и в хендлеры не попадает.
+# На отброшенные нажатия бот отвечает подсказкой не чаще FLOOD_NOTICE сек.
+# на пользователя — остальные «часики» гаснут сами, зато флуд не
+# превращается во флуд запросов answerCallbackQuery
+FLOOD_RATE        = float(os.environ.get("FLOOD_RATE", "3"))
+FLOOD_BURST       = float(os.environ.get("FLOOD_BURST", "10"))
+CALLBACK_DEBOUNCE = float(os.environ.get("CALLBACK_DEBOUNCE", "2"))
+FLOOD_NOTICE      = float(os.environ.get("FLOOD_NOTICE", "1"))
+
+# Рассылка итогов (/broadcast): не больше BROADCAST_RATE сообщений в секунду
+# на процесс, сколько бы конкурсов ни рассылалось сразу — у Telegram лимит
+# около 30 на бота, остальное оставляем живым ответам
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", "25"))
+
+# Адрес Bot API — свой сервер telegram-bot-api или заглушка из loadtest.py
+BOT_API_URL = os.environ.get("BOT_API_URL", "https://api.telegram.org/bot")
+
+# METRICS_PORT — метрики в формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics
+# (0 — не поднимать сервер; сводка всё равно доступна админу по /metrics)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+# Куда /profile складывает свёрнутые стеки (формат flamegraph.pl / speedscope)
+PROFILE_DIR = os.environ.get("PROFILE_DIR", ".")
+
+# WEBHOOK_URL задан — бот принимает обновления на встроенном HTTP-сервере
+# (WEBHOOK_LISTEN:PORT, путь WEBHOOK_PATH) вместо long polling. Telegram
+# присылает WEBHOOK_SECRET в каждом запросе; если секрет не задан, он
+# генерируется при старте и передаётся в setWebhook
+WEBHOOK_URL    = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT   = int(os.environ.get("PORT", "8443"))
+WEBHOOK_PATH   = os.environ.get("WEBHOOK_PATH", "webhook").strip("/")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
 
 PREDICT, WISH        = 0, 1
 ADMIN_CAT, ADMIN_WIN = 10, 11
@@ -59,30 +128,1517 @@ ADMIN_CAT, ADMIN_WIN = 10, 11
 DIVIDER = "· · · · · · · · · · · · · · ·"
 
 
+# ── МЕТРИКИ ───────────────────────────────────────────────────────────────────
+
+class Histogram:
+    """Гистограмма задержек с фиксированными границами корзин (секунды)."""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)     # последняя — +Inf
+        self.sum    = 0.0
+        self.n      = 0
+
+    def observe(self, v):
+        self.counts[bisect_left(self.BUCKETS, v)] += 1
+        self.sum += v
+        self.n   += 1
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попадает квантиль q."""
+        need, acc = q * self.n, 0
+        for bound, c in zip(self.BUCKETS + (float("inf"),), self.counts):
+            acc += c
+            if acc >= need:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Счётчики и гистограммы с метками; отдаются в текстовом формате Prometheus.
+
+    Пишут в них и цикл событий, и поток Writer, поэтому изменения под замком.
+    """
+
+    def __init__(self):
+        self.hists    = {}    # (имя, метки) -> Histogram
+        self.counters = {}    # (имя, метки) -> число
+        self.help     = {}
+        self._gauges  = []    # функции -> [(имя, метки, значение)]
+        self._lock    = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self.hists.get(key)
+            if h is None:
+                h = self.hists[key] = Histogram()
+            h.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, fn):
+        self._gauges.append(fn)
+        return fn
+
+    def series(self, name, label):
+        """{значение метки label: Histogram} одной гистограммы — для сводки /metrics."""
+        with self._lock:
+            return {dict(labels)[label]: h for (n, labels), h in self.hists.items() if n == name}
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+        out, typed = [], set()
+        def head(name, kind):
+            if name not in typed:
+                typed.add(name)
+                out.append(f"# TYPE {name} {kind}")
+        with self._lock:
+            for (name, labels), h in sorted(self.hists.items()):
+                head(name, "histogram")
+                acc = 0
+                for bound, c in zip(Histogram.BUCKETS + ("+Inf",), h.counts):
+                    acc += c
+                    out.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {acc}")
+                out.append(f"{name}_sum{fmt(labels)} {h.sum}")
+                out.append(f"{name}_count{fmt(labels)} {h.n}")
+            for (name, labels), v in sorted(self.counters.items()):
+                head(name, "counter")
+                out.append(f"{name}{fmt(labels)} {v}")
+        for fn in self._gauges:
+            for name, labels, v in fn():
+                head(name, "counter" if name.endswith("_total") else "gauge")
+                out.append(f"{name}{fmt(sorted(labels.items()))} {v}")
+        return "\n".join(out) + "\n"
+
+
+METRICS = Metrics()
+
+def instrumented(name, callback):
+    """Колбэк хендлера, который считает вызовы, ошибки и время."""
+    @functools.wraps(callback)
+    async def wrapper(update, ctx):
+        t0 = time.perf_counter()
+        try:
+            return await callback(update, ctx)
+        except Exception:
+            METRICS.inc("oscar_handler_errors_total", handler=name)
+            raise
+        finally:
+            METRICS.observe("oscar_handler_seconds", time.perf_counter() - t0, handler=name)
+    return wrapper
+
+
+class TimedRequest(HTTPXRequest):
+    """HTTPXRequest, который замеряет каждый вызов Bot API."""
+
+    async def do_request(self, url, *args, **kwargs):
+        method = url.rsplit("/", 1)[-1]
+        t0 = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, *args, **kwargs)
+        except Exception:
+            METRICS.inc("oscar_bot_api_errors_total", method=method)
+            raise
+        finally:
+            METRICS.observe("oscar_bot_api_seconds", time.perf_counter() - t0, method=method)
+        if code >= 400:
+            METRICS.inc("oscar_bot_api_errors_total", method=method)
+        return code, payload
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.write(METRICS.render())
+
+def start_metrics_server():
+    if not METRICS_PORT:
+        return
+    server = tornado.httpserver.HTTPServer(tornado.web.Application([(r"/metrics", MetricsHandler)]))
+    # У каждого обработчика при WORKERS > 1 свой порт: METRICS_PORT + номер
+    port = METRICS_PORT + WORKER_INDEX
+    server.listen(port, METRICS_HOST)
+    logger.info("Метрики: http://%s:%d/metrics", METRICS_HOST, port)
+
+
 # ── ХРАНИЛИЩЕ ─────────────────────────────────────────────────────────────────
 
 def load(path):
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    if not os.path.exists(path):
+        return {}
+    t0 = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    METRICS.observe("oscar_storage_seconds", time.perf_counter() - t0, op="load")
+    METRICS.inc("oscar_storage_bytes_total", os.path.getsize(path), op="load")
+    return data
 
 def save(path, data):
-    with open(path, "w", encoding="utf-8") as f:
+    # Пишем во временный файл и подменяем — оборванная запись не портит старый
+    t0  = time.perf_counter()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+        size = os.fstat(f.fileno()).st_size
+    os.replace(tmp, path)
+    METRICS.observe("oscar_storage_seconds", time.perf_counter() - t0, op="save")
+    METRICS.inc("oscar_storage_bytes_total", size, op="save")
+
+
+def _norm(s):
+    return s.strip().lower()
+
+def _same(a, b):
+    return _norm(a) == _norm(b)
+
+
+def _rows_where(col, value):
+    """Номера строк, в которых столбец матрицы равен value (value >= 0)."""
+    if np is not None:
+        return np.flatnonzero(np.frombuffer(col, dtype=np.int8) == value).tolist()
+    raw, b, out = col.tobytes(), bytes((value,)), []
+    i = raw.find(b)
+    while i >= 0:
+        out.append(i)
+        i = raw.find(b, i + 1)
+    return out
+
+def _bincount(col, n, skip=()):
+    """Сколько раз в столбце встречается каждый вариант 0..n-1, без строк skip."""
+    if np is not None:
+        a = np.frombuffer(col, dtype=np.int8)
+        counts = np.bincount(a[a >= 0], minlength=n)[:n].tolist()
+    else:
+        raw    = col.tobytes()
+        counts = [raw.count(bytes((i,))) for i in range(n)]
+    for r in skip:
+        if col[r] >= 0:
+            counts[col[r]] -= 1
+    return counts
+
+
+class Ballots:
+    """Бюллетени матрицей участники × категории: int8 в array, по строке на участника.
+
+    В ячейке — номер варианта в списке номинантов, -1 — ответа нет. Строки идут
+    в порядке первого голоса и не удаляются. Значения не из списка номинантов
+    (или записанные иначе, чем в списке) лежат в odd как есть, так что перевод
+    в формат votes.json и обратно — без потерь.
+    """
+
+    SIDES = ("predictions", "wishes")
+    NONE  = -1
+
+    def __init__(self, categories):
+        self.cats    = [c["id"] for c in categories]
+        self.col     = {cat_id: j for j, cat_id in enumerate(self.cats)}
+        self.options = [c["options"] for c in categories]
+        self.index   = [{_norm(opt): i for i, opt in enumerate(c["options"])} for c in categories]
+        self.width   = len(self.cats)
+        self.rows    = {}             # uid -> номер строки
+        self.uids    = []
+        self.names   = []
+        self.logins  = []
+        self.done    = bytearray()
+        self.cells   = {side: array("b") for side in self.SIDES}
+        self.odd     = {}             # uid -> {side: {cat_id: строка}}
+        self.completed = 0
+
+    @classmethod
+    def from_votes(cls, categories, votes):
+        """Из словаря формата votes.json."""
+        b = cls(categories)
+        for uid, entry in votes.items():
+            b.put(uid, entry)
+        return b
+
+    def to_votes(self):
+        """Обратно в словарь формата votes.json."""
+        return dict(self.items())
+
+    def copy(self):
+        """Снимок, который можно сохранять в другом потоке, пока идут новые голоса."""
+        b = Ballots.__new__(Ballots)
+        b.__dict__.update(self.__dict__)
+        b.rows   = dict(self.rows)
+        b.uids   = list(self.uids)
+        b.names  = list(self.names)
+        b.logins = list(self.logins)
+        b.done   = bytearray(self.done)
+        b.cells  = {side: array("b", a) for side, a in self.cells.items()}
+        b.odd    = dict(self.odd)     # put() заменяет запись целиком, а не правит её
+        return b
+
+    def frozen(self):
+        """Неизменяемая копия без запаса под рост: списки — кортежи, флаги — bytes.
+
+        put() на ней падает; copy() снова даёт изменяемую матрицу.
+        """
+        b = self.copy()
+        b.uids, b.names, b.logins = tuple(self.uids), tuple(self.names), tuple(self.logins)
+        b.done = bytes(self.done)
+        return b
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __contains__(self, uid):
+        return uid in self.rows
+
+    def nbytes(self):
+        return len(self.done) + sum(len(a) for a in self.cells.values())
+
+    def put(self, uid, entry):
+        """Записывает бюллетень, возвращает номер строки."""
+        r = self.rows.get(uid)
+        if r is None:
+            r = self.rows[uid] = len(self.uids)
+            self.uids.append(uid)
+            self.names.append(None)
+            self.logins.append(None)
+            self.done.append(0)
+            for a in self.cells.values():
+                a.extend([self.NONE] * self.width)
+        self.completed += bool(entry.get("completed")) - self.done[r]
+        self.names[r]  = entry.get("name")
+        self.logins[r] = entry.get("username")
+        self.done[r]   = bool(entry.get("completed"))
+        odd = {}
+        for side in self.SIDES:
+            row = [self.NONE] * self.width
+            for cat_id, opt in entry.get(side, {}).items():
+                j = self.col.get(cat_id)
+                i = self.index[j].get(_norm(opt)) if j is not None and isinstance(opt, str) else None
+                if i is not None:
+                    row[j] = i
+                if i is None or opt != self.options[j][i]:
+                    odd.setdefault(side, {})[cat_id] = opt
+            self.cells[side][r * self.width:(r + 1) * self.width] = array("b", row)
+        extra = {k: v for k, v in entry.items()
+                 if k not in ("name", "username", "completed") + self.SIDES}
+        if extra:
+            odd["extra"] = extra
+        if odd:
+            self.odd[uid] = odd
+        else:
+            self.odd.pop(uid, None)
+        return r
+
+    def get(self, uid):
+        r = self.rows.get(uid)
+        return None if r is None else self._decode(uid, r)
+
+    def _decode(self, uid, r):
+        entry = {}
+        if self.names[r] is not None:
+            entry["name"] = self.names[r]
+        if self.logins[r] is not None:
+            entry["username"] = self.logins[r]
+        odd = self.odd.get(uid, {})
+        for side in self.SIDES:
+            a = self.cells[side]
+            picks = {self.cats[j]: self.options[j][a[r * self.width + j]]
+                     for j in range(self.width) if a[r * self.width + j] >= 0}
+            picks.update(odd.get(side, {}))
+            entry[side] = picks
+        entry["completed"] = bool(self.done[r])
+        entry.update(odd.get("extra", {}))
+        return entry
+
+    def items(self):
+        for r, uid in enumerate(self.uids):
+            yield uid, self._decode(uid, r)
+
+    def column(self, side, j):
+        """Копия j-го столбца (одна категория у всех участников)."""
+        return self.cells[side][j::self.width]
+
+    def not_done(self):
+        """Строки участников, не закончивших голосование."""
+        out, i = [], self.done.find(0)
+        while i >= 0:
+            out.append(i)
+            i = self.done.find(0, i + 1)
+        return out
+
+    def unmatched(self, uid):
+        """Ответы участника не из списка номинантов — в виде бюллетеня."""
+        odd = self.odd.get(uid)
+        if not odd:
+            return {}
+        r = self.rows[uid]
+        return {side: {cat_id: opt for cat_id, opt in odd.get(side, {}).items()
+                       if cat_id not in self.col
+                       or self.cells[side][r * self.width + self.col[cat_id]] < 0}
+                for side in self.SIDES}
+
+    def row_hits(self, r, winners):
+        """(correct, wish_ok) строки r против вектора победителей."""
+        base = r * self.width
+        p, w = self.cells["predictions"], self.cells["wishes"]
+        return (sum(1 for j, v in enumerate(winners) if v >= 0 and p[base + j] == v),
+                sum(1 for j, v in enumerate(winners) if v >= 0 and w[base + j] == v))
+
+    def score_all(self, winners):
+        """(correct, wish_ok) всех строк разом — векторное сравнение с победителями."""
+        n = len(self)
+        if np is not None:
+            win = np.frombuffer(winners, dtype=np.int8)
+            out = []
+            for side in self.SIDES:
+                m = np.frombuffer(self.cells[side], dtype=np.int8).reshape(n, self.width)
+                out.append(((m == win) & (win >= 0)).sum(axis=1).tolist())
+                del m
+            return out
+        correct, wish_ok = [0] * n, [0] * n
+        for j, v in enumerate(winners):
+            if v < 0: continue
+            for side, acc in (("predictions", correct), ("wishes", wish_ok)):
+                for r in _rows_where(self.column(side, j), v):
+                    acc[r] += 1
+        return correct, wish_ok
+
+
+class Tallies:
+    """Счётчики прогнозов и желаний по категориям для /stats.
+
+    Обновляются при каждой записи бюллетеня за O(категорий): старый бюллетень
+    вычитается, новый прибавляется. Полный пересчёт нужен только для сверки.
+    """
+
+    def __init__(self, categories):
+        self.order   = {c["id"]: {_norm(opt): i for i, opt in enumerate(c["options"])} for c in categories}
+        self.options = {c["id"]: c["options"] for c in categories}
+        self.pred    = {c["id"]: {} for c in categories}
+        self.wish    = {c["id"]: {} for c in categories}
+
+    def key(self, cat_id, opt):
+        """Вариант из списка номинантов, если opt с ним совпадает, иначе opt как есть."""
+        i = self.order[cat_id].get(_norm(opt))
+        return opt if i is None else self.options[cat_id][i]
+
+    def _add(self, entry, delta):
+        for side, counts in (("predictions", self.pred), ("wishes", self.wish)):
+            for cat_id, opt in entry.get(side, {}).items():
+                if not opt or cat_id not in counts: continue
+                c   = counts[cat_id]
+                opt = self.key(cat_id, opt)
+                n   = c.get(opt, 0) + delta
+                if n: c[opt] = n
+                else: c.pop(opt, None)
+
+    def update(self, old, new):
+        if old and old.get("completed"):
+            self._add(old, -1)
+        if new and new.get("completed"):
+            self._add(new, +1)
+
+    def top(self, cat_id, n=2):
+        """Топ-n прогнозов и желаний; при равенстве — в порядке списка номинантов."""
+        order = self.order[cat_id]
+        key   = lambda kv: (-kv[1], order.get(_norm(kv[0]), len(order)), kv[0])
+        return (sorted(self.pred[cat_id].items(), key=key)[:n],
+                sorted(self.wish[cat_id].items(), key=key)[:n])
+
+    def diff(self, other):
+        """Категории, в которых счётчики расходятся с другим экземпляром."""
+        return [cat_id for cat_id in self.pred
+                if self.pred[cat_id] != other.pred[cat_id] or self.wish[cat_id] != other.wish[cat_id]]
+
+
+class Scoreboard:
+    """Рейтинг /leaderboard с инкрементальным пересчётом поверх матрицы Ballots.
+
+    Новый или исправленный результат категории — это сравнение одного столбца
+    матрицы со старым и новым победителем: счёт меняется только у совпавших
+    строк. Участники лежат в SortedList ключами-числами: старшие разряды —
+    счёт (correct, затем wish_ok), младшие — номер строки в Ballots, то есть
+    порядок первого голоса. Топ, лучший мечтатель, место участника и его
+    соседи по таблице достаются за O(log n) без сортировки.
+
+    Результат популярной категории задевает большую долю участников; тогда
+    переставлять их в SortedList по одному дороже, чем собрать оба списка
+    заново одним проходом (_relink_all).
+    """
+
+    NO_RESULT    = -2    # не совпадает ни с одной ячейкой, в том числе с -1
+    ROW_BITS     = 32
+    RELINK_SHARE = 16    # задето больше 1/16 рейтинга — пересобрать целиком
+
+    def __init__(self, ballots, results=None):
+        self.b       = ballots
+        self.winner  = array("b", [self.NO_RESULT] * ballots.width)
+        self.correct = array("b")
+        self.wish_ok = array("b")
+        self.linked  = bytearray()
+        for cat_id, winner in (results or {}).items():
+            j = ballots.col.get(cat_id)
+            if j is not None:
+                self.winner[j] = ballots.index[j].get(_norm(winner), self.NO_RESULT)
+        n = len(ballots)
+        correct, wish_ok = ballots.score_all(self.winner) if n else ([], [])
+        self.correct.extend(correct)
+        self.wish_ok.extend(wish_ok)
+        self.linked.extend(ballots.done)
+        self._relink_all()
+
+    def __len__(self):
+        return len(self.rank)
+
+    def _score(self, r):
+        # Чем лучше счёт, тем меньше число: SortedList идёт от лидера
+        w = self.b.width
+        return (w - self.correct[r]) * (w + 1) + w - self.wish_ok[r]
+
+    def _rank_key(self, r):
+        return (self._score(r) << self.ROW_BITS) | r
+
+    def _dream_key(self, r):
+        w = self.b.width
+        return (((w - self.wish_ok[r]) * (w + 1) + w - self.correct[r]) << self.ROW_BITS) | r
+
+    def _relink_all(self):
+        """rank и dream заново по массивам correct/wish_ok — для всех строк с linked."""
+        w = self.b.width
+        if np is not None:
+            rows    = np.flatnonzero(np.frombuffer(self.linked, dtype=np.uint8))
+            correct = np.frombuffer(self.correct, dtype=np.int8)[rows].astype(np.int64)
+            wish_ok = np.frombuffer(self.wish_ok, dtype=np.int8)[rows].astype(np.int64)
+            rank    = (((w - correct) * (w + 1) + w - wish_ok) << self.ROW_BITS) | rows
+            dream   = (((w - wish_ok) * (w + 1) + w - correct) << self.ROW_BITS) | rows
+            # Отсортированный вход SortedList раскладывает без пересортировки
+            self.rank  = SortedList(np.sort(rank).tolist())
+            self.dream = SortedList(np.sort(dream).tolist())
+        else:
+            rows = [r for r in range(len(self.linked)) if self.linked[r]]
+            self.rank  = SortedList(map(self._rank_key, rows))
+            self.dream = SortedList(map(self._dream_key, rows))
+
+    def _link(self, r):
+        self.rank.add(self._rank_key(r))
+        self.dream.add(self._dream_key(r))
+        self.linked[r] = 1
+
+    def _unlink(self, r):
+        if self.linked[r]:
+            self.rank.remove(self._rank_key(r))
+            self.dream.remove(self._dream_key(r))
+            self.linked[r] = 0
+
+    def set_voter(self, r):
+        """Пересчитывает строку r после того, как её бюллетень записан в Ballots."""
+        while len(self.correct) <= r:
+            self.correct.append(0)
+            self.wish_ok.append(0)
+            self.linked.append(0)
+        self._unlink(r)
+        self.correct[r], self.wish_ok[r] = self.b.row_hits(r, self.winner)
+        if self.b.done[r]:
+            self._link(r)
+
+    def set_result(self, cat_id, winner):
+        """Учитывает новый или исправленный результат категории."""
+        j = self.b.col.get(cat_id)
+        if j is None:
+            return
+        new = self.b.index[j].get(_norm(winner), self.NO_RESULT)
+        old = self.winner[j]
+        if new == old:
+            return
+        self.winner[j] = new
+        changes = []      # (correct или wish_ok, ±1, строки)
+        for acc, side in zip((self.correct, self.wish_ok), Ballots.SIDES):
+            col = self.b.column(side, j)
+            for v, d in ((old, -1), (new, +1)):
+                if v >= 0:
+                    changes.append((acc, d, _rows_where(col, v)))
+        if sum(len(rows) for _, _, rows in changes) * self.RELINK_SHARE > len(self.rank):
+            for acc, d, rows in changes:
+                for r in rows:
+                    acc[r] += d
+            self._relink_all()
+            return
+        delta = {}
+        for acc, d, rows in changes:
+            i = acc is self.wish_ok
+            for r in rows:
+                delta.setdefault(r, [0, 0])[i] += d
+        for r, (dc, dw) in delta.items():
+            relink = self.linked[r]
+            self._unlink(r)
+            self.correct[r] += dc
+            self.wish_ok[r] += dw
+            if relink:
+                self._link(r)
+
+    def top(self, n=20):
+        """Строки первых n участников рейтинга."""
+        mask = (1 << self.ROW_BITS) - 1
+        return [k & mask for k in islice(self.rank, n)]
+
+    def standing(self, r):
+        """(место, всего, сколько ещё участников с тем же счётом) для строки r.
+
+        Место — как в спорте: 1 + число участников со счётом строго выше.
+        """
+        if not self.linked[r]:
+            return None
+        score = self._score(r)
+        lo = self.rank.bisect_left(score << self.ROW_BITS)
+        hi = self.rank.bisect_left((score + 1) << self.ROW_BITS)
+        return lo + 1, len(self.rank), hi - lo - 1
+
+    def place(self, r):
+        return self.rank.bisect_left(self._score(r) << self.ROW_BITS) + 1
+
+    def around(self, r, k=3):
+        """Строки участников на k позиций выше и ниже r, включая саму r."""
+        i    = self.rank.index(self._rank_key(r))
+        mask = (1 << self.ROW_BITS) - 1
+        return [key & mask for key in self.rank.islice(max(0, i - k), i + k + 1)]
+
+    def dreamer(self):
+        """Строка участника с наибольшим числом сбывшихся желаний или None."""
+        if self.dream:
+            r = self.dream[0] & ((1 << self.ROW_BITS) - 1)
+            if self.wish_ok[r] > 0:
+                return r
+        return None
+
+    def diff(self, scores):
+        """uid, у которых счёт расходится с полным пересчётом (uid, correct, wish_ok)."""
+        fresh = {uid: (c, w) for uid, c, w in scores}
+        rows  = self.b.rows
+        bad   = [uid for uid, r in rows.items()
+                 if self.linked[r] and fresh.get(uid) != (self.correct[r], self.wish_ok[r])]
+        return bad + [uid for uid in fresh if uid not in rows or not self.linked[rows[uid]]]
+
+
+class Writer:
+    """Единственная задача, которая пишет на диск.
+
+    Хендлер меняет данные в памяти, ставит изменение в очередь и ждёт только
+    подтверждения. Всё, что накопилось, пока шла предыдущая запись, уходит на
+    диск одной пачкой в отдельном потоке — цикл событий тем временем
+    обслуживает остальных.
+    """
+
+    def __init__(self, store):
+        self.store     = store
+        self.queue     = None
+        self._task     = None
+        self.commits   = 0        # сколько раз писали на диск
+        self.written   = 0        # сколько изменений записано
+        self.failed    = 0
+        self.max_depth = 0
+        self.last_ms   = 0.0      # от постановки в очередь до подтверждения
+        self.max_ms    = 0.0
+        self.total_ms  = 0.0
+
+    @property
+    def depth(self):
+        return self.queue.qsize() if self.queue else 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, op):
+        """Ставит изменение в очередь и ждёт, пока оно окажется на диске."""
+        if self._task is None:
+            # Вне бота (migrate, замеры) очереди нет — пишем сразу
+            self.store.commit([op])
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((op, fut, time.perf_counter()))
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        await fut
+
+    def post(self, op):
+        """Как submit, но без ожидания подтверждения — для данных, которые не жалко
+        потерять за последние секунды (сессии разговоров)."""
+        if self._task is None:
+            self.store.commit([op])
+            return
+        self.queue.put_nowait((op, None, time.perf_counter()))
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < WRITE_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                # Снимок берём здесь, в цикле событий, а пишем в потоке
+                job = self.store.prepare([op for op, _, _ in batch])
+                t0  = time.perf_counter()
+                await asyncio.to_thread(job)
+                METRICS.observe("oscar_storage_seconds", time.perf_counter() - t0, op="commit")
+            except Exception as e:
+                logger.exception("Не удалось записать изменений: %d", len(batch))
+                self.failed += len(batch)
+                for _, fut, _ in batch:
+                    if fut and not fut.done(): fut.set_exception(e)
+            else:
+                now = time.perf_counter()
+                self.commits += 1
+                self.written += len(batch)
+                for _, fut, t0 in batch:
+                    self.last_ms   = (now - t0) * 1000
+                    self.max_ms    = max(self.max_ms, self.last_ms)
+                    self.total_ms += self.last_ms
+                    if fut and not fut.done(): fut.set_result(None)
+            for _ in batch:
+                self.queue.task_done()
+
+    async def flush(self):
+        """Ждёт, пока всё, что уже в очереди, окажется на диске."""
+        if self._task is not None:
+            await self.queue.join()
+
+    async def stop(self):
+        """Дописывает всё, что уже в очереди, и останавливает задачу."""
+        if self._task is None:
+            return
+        await self.queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self):
+        return {"depth": self.depth, "max_depth": self.max_depth, "commits": self.commits,
+                "written": self.written, "failed": self.failed, "last_ms": self.last_ms,
+                "max_ms": self.max_ms,
+                "avg_ms": self.total_ms / self.written if self.written else 0.0}
+
+
+class Store:
+    """Общая часть хранилищ: матрица бюллетеней, счётчики /stats и рейтинг.
+
+    Хендлеры работают только через методы хранилища: get/put, results/set_result,
+    tallies, board, completed_count, get_config/set_config. put, set_result и
+    set_config сразу меняют данные в памяти и возвращают управление, когда
+    Writer подтвердил запись.
+    """
+
+    def completed_count(self):
+        return self.ballots.completed
+
+    def count_tallies(self):
+        """Счётчики /stats с нуля — по столбцам матрицы бюллетеней."""
+        b, t = self.ballots, Tallies(self.categories)
+        skip = b.not_done()
+        for j, cat_id in enumerate(b.cats):
+            opts = b.options[j]
+            for side, counts in (("predictions", t.pred), ("wishes", t.wish)):
+                n = _bincount(b.column(side, j), len(opts), skip)
+                counts[cat_id] = {opts[i]: k for i, k in enumerate(n) if k}
+        for uid in b.odd:
+            if b.done[b.rows[uid]]:
+                t._add(b.unmatched(uid), +1)
+        return t
+
+    def scores(self):
+        """(uid, correct, wish_ok), пересчитанные с нуля, — для сверки рейтинга."""
+        results = self.results
+        for uid, data in self.entries():
+            if not data.get("completed"): continue
+            preds   = data.get("predictions", {})
+            wishes  = data.get("wishes", {})
+            correct = sum(1 for cid,w in results.items() if _same(preds.get(cid,""), w))
+            wish_ok = sum(1 for cid,w in results.items() if _same(wishes.get(cid,""), w))
+            yield uid, correct, wish_ok
+
+    frozen = False
+
+    def rebuild(self):
+        """Строит счётчики /stats и рейтинг с нуля."""
+        if self.frozen:
+            self.ballots = self.ballots.frozen()
+        self.tallies = self.count_tallies()
+        self.board   = Scoreboard(self.ballots, self.results)
+
+    def check(self):
+        """Сверяет инкрементальные счётчики и рейтинг с полным пересчётом.
+
+        Возвращает описания расхождений; если они есть, всё строится заново.
+        """
+        bad = [f"/stats: {cat_id}" for cat_id in self.tallies.diff(self.count_tallies())]
+        uids = self.board.diff(self.scores())
+        if uids:
+            bad.append(f"/leaderboard: {len(uids)} уч.")
+        if bad:
+            logger.warning("Счётчики разошлись с голосами: %s", ", ".join(bad))
+            self.rebuild()
+        return bad
+
+    def voter(self, r):
+        """(name, username) участника по строке матрицы."""
+        b = self.ballots
+        return b.names[r] or "—", b.logins[r] or ""
+
+    def get(self, uid, default=None):
+        entry = self.ballots.get(uid)
+        return default if entry is None else entry
+
+    def _apply_vote(self, uid, entry):
+        self.tallies.update(self.ballots.get(uid), entry)
+        self.board.set_voter(self.ballots.put(uid, entry))
+
+    def _apply_result(self, cat_id, winner):
+        self.results[cat_id] = winner
+        self.board.set_result(cat_id, winner)
+
+    async def put(self, uid, entry):
+        if self.frozen:
+            raise RuntimeError("Приём голосов закрыт")
+        self._apply_vote(uid, entry)
+        await self.writer.submit(("vote", uid, entry))
+
+    async def set_result(self, cat_id, winner):
+        self._apply_result(cat_id, winner)
+        await self.writer.submit(("result", cat_id, winner))
+
+    async def set_config(self, cfg):
+        await self.writer.submit(("config", cfg))
+
+    async def freeze(self):
+        """Закрывает приём голосов: сжимает их на диске, матрицу делает неизменяемой.
+
+        Рейтинг пересчитывается по замороженной матрице, дальше его меняют
+        только результаты.
+        """
+        self.frozen = True
+        await self.writer.submit(("compact",))
+        self.ballots = self.ballots.frozen()
+        self.board   = Scoreboard(self.ballots, self.results)
+
+    def sync(self):
+        """Подхватывает изменения других процессов; True — данные поменялись.
+
+        Хранилищу, которым владеет один процесс, подхватывать нечего.
+        """
+        return False
+
+    def thaw(self):
+        """Снова принимает голоса — если дедлайн передвинули на будущее."""
+        self.frozen  = False
+        self.ballots = self.ballots.copy()
+        self.board   = Scoreboard(self.ballots, self.results)
+
+    def prepare(self, ops):
+        """Снимок того, что нужно записать для ops, — в цикле событий.
+
+        Возвращает функцию без аргументов, которая пишет снимок на диск;
+        Writer вызывает её в отдельном потоке.
+        """
+        raise NotImplementedError
+
+    def commit(self, ops):
+        """Синхронная запись — для CLI, где нет цикла событий."""
+        self.prepare(ops)()
+
+    def start(self):
+        self.writer.start()
+
+    async def stop(self):
+        await self.writer.stop()
+        self.close()
+
+    def close(self):
+        pass
+
+
+class VoteStore(Store):
+    """Голоса и результаты в памяти: файлы читаются один раз, пишутся целиком снимком."""
+
+    def __init__(self, categories, path, results_path, config_path):
+        self.categories   = categories
+        self.path         = path
+        self.results_path = results_path
+        self.config_path  = config_path
+        self.ballots = Ballots(categories)
+        self.results = {}
+        self.tallies = Tallies(categories)
+        self.board   = Scoreboard(self.ballots)
+        self.writer  = Writer(self)
+
+    def open(self):
+        self.ballots = Ballots.from_votes(self.categories, load(self.path))
+        self.results = load(self.results_path)
+        self.rebuild()
+        logger.info("Загружено голосов: %d", len(self.ballots))
+
+    def entries(self):
+        return self.ballots.items()
+
+    def put_many(self, items):
+        """Много голосов сразу, мимо Writer (CLI): в память по одному, на диск — одним снимком."""
+        n = 0
+        for n, (uid, entry) in enumerate(items, 1):
+            self._apply_vote(uid, entry)
+        self.commit([("compact",)])
+        return n
+
+    def prepare(self, ops):
+        kinds   = {op[0] for op in ops}
+        ballots = self.ballots.copy() if kinds & {"vote", "compact"} else None
+        results = dict(self.results) if "result" in kinds else None
+        cfg     = next((op[1] for op in reversed(ops) if op[0] == "config"), None)
+
+        def job():
+            if ballots is not None:
+                save(self.path, ballots.to_votes())
+            if results is not None:
+                save(self.results_path, results)
+            if cfg is not None:
+                save(self.config_path, cfg)
+        return job
+
+    def get_config(self):
+        return load(self.config_path)
+
+    def config_stamp(self):
+        """Меняется, когда config.json переписан — нами или снаружи."""
+        try:
+            st = os.stat(self.config_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+
+class Journal:
+    """Журнал изменений: одна JSON-запись на строку, файл только дописывается.
+
+    Читается и пишется байтами: запись, оборванная посреди UTF-8 символа
+    (падение во время записи), пропускается так же, как любая битая строка.
+    """
+
+    def __init__(self, path):
+        self.path    = path
+        self.rotated = path + ".1"
+        self.count   = 0
+        self._f      = None
+
+    def replay(self):
+        # .1 — журнал, который компактор не успел свернуть в снимок
+        for path in (self.rotated, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                for n, line in enumerate(f, 1):
+                    try:
+                        # UnicodeDecodeError — тоже ValueError
+                        rec = json.loads(line)
+                    except ValueError:
+                        logger.warning("%s:%d — оборванная запись пропущена", path, n)
+                        continue
+                    self.count += 1
+                    yield rec
+
+    def open(self):
+        self._f = open(self.path, "ab+")
+        # Если прошлый процесс упал посреди записи, начинаем с новой строки
+        if self._f.tell():
+            self._f.seek(-1, os.SEEK_END)
+            if self._f.read(1) != b"\n":
+                self._f.write(b"\n")
+
+    def append(self, recs):
+        self._f.write("".join(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n"
+                              for rec in recs).encode("utf-8"))
+        self._f.flush()
+        self.count += len(recs)
+
+    def sync(self):
+        if self._f:
+            os.fsync(self._f.fileno())
+
+    def rotate(self):
+        self._f.close()
+        os.replace(self.path, self.rotated)
+        self.count = 0
+        self.open()
+
+    def drop_rotated(self):
+        if os.path.exists(self.rotated):
+            os.remove(self.rotated)
+
+    def close(self):
+        if self._f:
+            self._f.close()
+            self._f = None
+
+
+class JournalStore(VoteStore):
+    """Каждое изменение — строка в журнале; votes.json и results.json служат снимком.
+
+    Пачка изменений дописывается в журнал одним fsync; раз в COMPACT_EVERY
+    записей журнал сворачивается в снимок, при старте снимок дочитывается
+    хвостом журнала. Записи целиком заменяют бюллетень или результат, поэтому
+    повторное применение безопасно.
+
+    Пачка подтверждается сразу после fsync журнала. Снимок пишется в своём
+    потоке: Writer только переключается на свежий журнал, а старый (.1)
+    удаляется, когда снимок на диске.
+    """
+
+    def __init__(self, categories, path, results_path, config_path, journal_path):
+        super().__init__(categories, path, results_path, config_path)
+        self.journal     = Journal(journal_path)
+        self._compacting = None     # поток, который пишет снимок
+
+    def open(self):
+        super().open()
+        for rec in self.journal.replay():
+            if rec.get("op") == "vote":
+                self.ballots.put(rec["uid"], rec["entry"])
+            elif rec.get("op") == "result":
+                self.results[rec["cat"]] = rec["winner"]
+        self.rebuild()
+        self.journal.open()
+        logger.info("Журнал %s: применено записей %d", self.journal.path, self.journal.count)
+        if os.path.exists(self.journal.rotated):
+            # Прошлый процесс не дописал снимок — сворачиваем сейчас, иначе следующий rotate затрёт .1
+            self.compact(self.ballots, self.results)
+
+    def prepare(self, ops):
+        recs, cfg, compact = [], None, False
+        for op in ops:
+            if op[0] == "vote":
+                recs.append({"op": "vote", "uid": op[1], "entry": op[2]})
+            elif op[0] == "result":
+                recs.append({"op": "result", "cat": op[1], "winner": op[2]})
+            elif op[0] == "config":
+                cfg = op[1]
+            else:
+                compact = True
+        # Писатель один, так что счётчик журнала и поток снимка сейчас никто не трогает.
+        # Пока пишется прошлый снимок, по счётчику новый не начинаем — журнал просто растёт
+        snap = None
+        if compact or (self.journal.count + len(recs) >= COMPACT_EVERY and not self.compacting):
+            snap = self.ballots.copy(), dict(self.results)
+
+        def job():
+            if recs:
+                self.journal.append(recs)
+                self.journal.sync()
+            if cfg is not None:
+                save(self.config_path, cfg)
+            if snap:
+                # .1 ещё не в снимке — второй rotate его бы затёр
+                if self._compacting:
+                    self._compacting.join()
+                self.journal.rotate()
+                self._compacting = threading.Thread(target=self.snapshot, args=snap,
+                                                    name="compact", daemon=True)
+                self._compacting.start()
+        return job
+
+    @property
+    def compacting(self):
+        return self._compacting is not None and self._compacting.is_alive()
+
+    def compact(self, ballots, results):
+        self.journal.rotate()
+        self.snapshot(ballots, results)
+
+    def snapshot(self, ballots, results):
+        # Новые записи уже идут в свежий журнал, .1 удаляем, когда снимок на диске
+        t0 = time.perf_counter()
+        save(self.path, ballots.to_votes())
+        save(self.results_path, results)
+        self.journal.drop_rotated()
+        METRICS.observe("oscar_storage_seconds", time.perf_counter() - t0, op="compact")
+        logger.info("Журнал свёрнут в снимок: %d голосов", len(ballots))
+
+    async def stop(self):
+        await self.writer.stop()
+        if self._compacting:
+            await asyncio.to_thread(self._compacting.join)
+        self.compact(self.ballots, self.results)
+        self.close()
+
+    def close(self):
+        # CLI (import, migrate) закрывает хранилище сразу после commit — снимок должен успеть лечь
+        if self._compacting:
+            self._compacting.join()
+        self.journal.close()
+
+
+class SqliteStore(Store):
+    """SQLite в режиме WAL: бюллетени построчно по (uid, категория).
+
+    Бюллетени и результаты загружаются в память при старте, так что чтения
+    в хендлерах базу не трогают. Пишет Writer через своё соединение, по
+    транзакции на пачку; сверка /stats — агрегатные запросы по индексам.
+
+    Если в базу пишут несколько процессов (WORKERS > 1), каждый в той же
+    транзакции отмечает в changes, чей голос или какой результат записал.
+    sync() дочитывает чужие отметки и применяет к памяти только эти строки.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS voters (
+            uid       TEXT PRIMARY KEY,
+            name      TEXT NOT NULL DEFAULT '',
+            username  TEXT NOT NULL DEFAULT '',
+            completed INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS ballots (
+            uid        TEXT NOT NULL,
+            cat        TEXT NOT NULL,
+            prediction TEXT NOT NULL DEFAULT '',
+            wish       TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (uid, cat)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS ballots_cat_prediction ON ballots (cat, prediction);
+        CREATE INDEX IF NOT EXISTS ballots_cat_wish       ON ballots (cat, wish);
+        CREATE TABLE IF NOT EXISTS results (
+            cat    TEXT PRIMARY KEY,
+            winner TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS config (
+            key   TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            seq    INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            kind   TEXT NOT NULL,
+            key    TEXT NOT NULL
+        );
+    """
+    CHANGES_KEEP = 100_000        # отставший сильнее процесс перечитывает базу целиком
+
+    def __init__(self, categories, path):
+        self.categories = categories
+        self.path    = path
+        self.db      = None           # чтения из цикла событий
+        self.wdb     = None           # записи из потока Writer
+        self.ballots = Ballots(categories)
+        self.results = {}
+        self.tallies = Tallies(categories)
+        self.board   = Scoreboard(self.ballots)
+        self.writer  = Writer(self)
+        self.shared  = WORKERS > 1
+        self.origin  = str(os.getpid())
+        self._seq    = 0              # последняя применённая отметка changes
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def open(self):
+        self.db  = self._connect()
+        self.db.executescript(self.SCHEMA)
+        self.wdb = self._connect()
+        # Отметку берём до чтения: то, что запишут между ними, применится дважды — это безопасно
+        self._seq = self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        self.rebuild()
+        logger.info("SQLite %s: голосов %d", self.path, len(self.ballots))
+
+    def close(self):
+        for db in (self.db, self.wdb):
+            if db: db.close()
+        self.db = self.wdb = None
+
+    def _put(self, uid, entry):
+        # UPSERT сохраняет rowid — порядок голосующих как в votes.json
+        self.wdb.execute(
+            "INSERT INTO voters (uid, name, username, completed) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (uid) DO UPDATE SET name = excluded.name, "
+            "username = excluded.username, completed = excluded.completed",
+            (uid, entry.get("name", ""), entry.get("username", ""), int(bool(entry.get("completed")))))
+        self.wdb.execute("DELETE FROM ballots WHERE uid = ?", (uid,))
+        preds  = entry.get("predictions", {})
+        wishes = entry.get("wishes", {})
+        self.wdb.executemany(
+            "INSERT INTO ballots (uid, cat, prediction, wish) VALUES (?, ?, ?, ?)",
+            [(uid, cat, preds.get(cat, ""), wishes.get(cat, "")) for cat in {**preds, **wishes}])
+
+    def _set_result(self, cat_id, winner):
+        self.wdb.execute(
+            "INSERT INTO results (cat, winner) VALUES (?, ?) "
+            "ON CONFLICT (cat) DO UPDATE SET winner = excluded.winner", (cat_id, winner))
+
+    def _set_config(self, cfg):
+        self.wdb.execute("DELETE FROM config")
+        self.wdb.executemany("INSERT INTO config (key, value) VALUES (?, ?)",
+                             [(k, json.dumps(v, ensure_ascii=False)) for k, v in cfg.items()])
+
+    def prepare(self, ops):
+        # Бюллетени в ops уже готовые словари, снимок не нужен
+        marks = [(self.origin, op[0], op[1]) for op in ops if op[0] in ("vote", "result")]
+        def job():
+            with self.wdb:
+                for op in ops:
+                    if op[0] == "vote":     self._put(op[1], op[2])
+                    elif op[0] == "result": self._set_result(op[1], op[2])
+                    elif op[0] == "config": self._set_config(op[1])
+                if self.shared and marks:
+                    self.wdb.executemany("INSERT INTO changes (origin, kind, key) VALUES (?, ?, ?)", marks)
+                    self.wdb.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?",
+                                     (self.CHANGES_KEEP,))
+            if any(op[0] == "compact" for op in ops):
+                # Переносим WAL в основной файл базы и обрезаем его
+                self.wdb.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return job
+
+    def put_many(self, items):
+        """Много голосов одной транзакцией (CLI). В память — сразу, чтобы
+        следующий бюллетень того же участника дописывался к этому."""
+        n = 0
+        with self.wdb:
+            for n, (uid, entry) in enumerate(items, 1):
+                self._put(uid, entry)
+                self._apply_vote(uid, entry)
+        return n
+
+    def entries(self, where="", args=()):
+        """Все голоса (uid, entry) в порядке первой записи — одним проходом по базе."""
+        uid, entry = None, None
+        for row in self.db.execute(
+                "SELECT v.uid, v.name, v.username, v.completed, b.cat, b.prediction, b.wish "
+                f"FROM voters v LEFT JOIN ballots b ON b.uid = v.uid {where} ORDER BY v.rowid", args):
+            if row[0] != uid:
+                if entry:
+                    yield uid, entry
+                uid   = row[0]
+                entry = {"name": row[1], "username": row[2], "predictions": {},
+                         "wishes": {}, "completed": bool(row[3])}
+            if row[4] is not None:
+                if row[5]: entry["predictions"][row[4]] = row[5]
+                if row[6]: entry["wishes"][row[4]]      = row[6]
+        if entry:
+            yield uid, entry
+
+    def rebuild(self):
+        self.ballots = Ballots(self.categories)
+        for uid, entry in self.entries():
+            self.ballots.put(uid, entry)
+        self.results = dict(self.db.execute("SELECT cat, winner FROM results ORDER BY rowid"))
+        super().rebuild()
+
+    def sync(self):
+        if not self.shared:
+            return False
+        rows = self.db.execute("SELECT seq, origin, kind, key FROM changes WHERE seq > ? ORDER BY seq",
+                               (self._seq,)).fetchall()
+        if not rows:
+            return False
+        first = self.db.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+        gap   = first > self._seq + 1
+        self._seq = rows[-1][0]
+        if gap:
+            logger.warning("SQLite %s: пропущено больше %d изменений, читаем заново", self.path, self.CHANGES_KEEP)
+            self.rebuild()
+            return True
+        votes   = {key for _, origin, kind, key in rows if origin != self.origin and kind == "vote"}
+        results = {key for _, origin, kind, key in rows if origin != self.origin and kind == "result"}
+        if not votes and not results:
+            return False
+        if votes and self.frozen:
+            # Голос, записанный соседом перед самым закрытием, — в замороженную матрицу только пересборкой
+            self.rebuild()
+            return True
+        votes = list(votes)
+        for i in range(0, len(votes), 500):
+            chunk = votes[i:i + 500]
+            for uid, entry in self.entries(f"WHERE v.uid IN ({','.join('?' * len(chunk))})", chunk):
+                self._apply_vote(uid, entry)
+        for cat_id in results:
+            row = self.db.execute("SELECT winner FROM results WHERE cat = ?", (cat_id,)).fetchone()
+            if row:
+                self._apply_result(cat_id, row[0])
+        return True
+
+    def _count(self, cat_id, column):
+        return dict(self.db.execute(
+            f"SELECT b.{column}, COUNT(*) FROM ballots b JOIN voters v ON v.uid = b.uid "
+            f"WHERE b.cat = ? AND b.{column} != '' AND v.completed "
+            f"GROUP BY b.{column}", (cat_id,)))
+
+    def count_tallies(self):
+        t = Tallies(self.categories)
+        for cat_id in t.pred:
+            for counts, column in ((t.pred, "prediction"), (t.wish, "wish")):
+                c = counts[cat_id]
+                for opt, n in self._count(cat_id, column).items():
+                    opt = t.key(cat_id, opt)
+                    c[opt] = c.get(opt, 0) + n
+        return t
+
+    def scores(self):
+        return self.db.execute(
+            "SELECT v.uid,"
+            "  COALESCE(SUM(lower(trim(b.prediction)) = lower(trim(r.winner))), 0),"
+            "  COALESCE(SUM(lower(trim(b.wish))       = lower(trim(r.winner))), 0) "
+            "FROM voters v LEFT JOIN ballots b ON b.uid = v.uid "
+            "LEFT JOIN results r ON r.cat = b.cat "
+            "WHERE v.completed GROUP BY v.rowid ORDER BY v.rowid")
+
+    def get_config(self):
+        return {k: json.loads(v) for k, v in self.db.execute("SELECT key, value FROM config")}
+
+    def config_stamp(self):
+        # data_version растёт, когда базу меняет другое соединение — в том числе наш Writer
+        return self.db.execute("PRAGMA data_version").fetchone()[0]
+
+
+def shard(path, cid):
+    """Файл конкурса cid: у конкурса по умолчанию — сам path, у остальных — votes.<cid>.json."""
+    if cid == DEFAULT_CONTEST:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{cid}{ext}"
+
+def make_store(cid, categories, storage=None):
+    """Хранилище конкурса: свои файлы или своя база, общих блокировок с другими нет."""
+    storage = storage or STORAGE
+    if storage == "journal":
+        return JournalStore(categories, shard(DATA_FILE, cid), shard(RESULTS_FILE, cid),
+                            shard(CONFIG_FILE, cid), shard(JOURNAL_FILE, cid))
+    if storage == "sqlite":
+        return SqliteStore(categories, shard(DB_FILE, cid))
+    return VoteStore(categories, shard(DATA_FILE, cid), shard(RESULTS_FILE, cid), shard(CONFIG_FILE, cid))
+
+
+# ── СЕССИИ ────────────────────────────────────────────────────────────────────
+
+class SessionStore(BasePersistence):
+    """Persistence для ConversationHandler: шаг опроса и ctx.user_data участника.
+
+    Application раз в SESSION_FLUSH сек. передаёт только тех, у кого что-то
+    изменилось; строки ставятся в очередь Writer и уходят на диск одной
+    транзакцией. Когда разговор заканчивается, его user_data удаляется — в файле
+    остаются только незавершённые опросы, и при старте читаются только они.
+
+    Исключение — выбранный через /start <id> конкурс: он живёт дольше
+    разговора, поэтому хранится отдельно (таблица contests) и после рестарта
+    возвращается в user_data каждого, кто выбирал конкурс.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS conversations (
+            name  TEXT NOT NULL,
+            key   TEXT NOT NULL,
+            uid   INTEGER,
+            state TEXT NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS conversations_uid ON conversations (uid);
+        CREATE TABLE IF NOT EXISTS user_data (
+            uid  INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS contests (
+            uid     INTEGER PRIMARY KEY,
+            contest TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False,
+                                                     user_data=True, callback_data=False),
+                         update_interval=SESSION_FLUSH)
+        self.path   = path
+        self.db     = None
+        self.active   = set()     # uid участников с незавершённым разговором
+        self.contests = {}        # uid -> выбранный конкурс, как записано в базе
+        self.writer   = Writer(self)
+
+    def open(self):
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        n, = self.db.execute("SELECT COUNT(*) FROM conversations").fetchone()
+        self.contests = dict(self.db.execute("SELECT uid, contest FROM contests"))
+        logger.info("Сессии %s: незавершённых разговоров %d, выбравших конкурс %d",
+                    self.path, n, len(self.contests))
+
+    def close(self):
+        if self.db: self.db.close()
+        self.db = None
+
+    def prepare(self, ops):
+        # Application отдаёт user_data всех, кто писал боту, а не только тех, кто
+        # проходит опрос. Кто его проходит, здесь уже известно: все изменения
+        # за проход попадают в очередь раньше, чем Writer берёт пачку
+        ops = [op for op in ops if op[0] != "user" or op[1] in self.active or op[2] is None]
+        def job():
+            with self.db:
+                for op in ops:
+                    if op[0] == "user" and op[2] is None:
+                        self.db.execute("DELETE FROM user_data WHERE uid = ?", (op[1],))
+                    elif op[0] == "user":
+                        self.db.execute("INSERT OR REPLACE INTO user_data (uid, data) VALUES (?, ?)",
+                                        (op[1], op[2]))
+                    elif op[0] == "contest":
+                        self.db.execute("INSERT OR REPLACE INTO contests (uid, contest) VALUES (?, ?)",
+                                        (op[1], op[2]))
+                    elif op[4] is None:
+                        self.db.execute("DELETE FROM conversations WHERE name = ? AND key = ?",
+                                        (op[1], op[2]))
+                        self.db.execute("DELETE FROM user_data WHERE uid = ?", (op[3],))
+                    else:
+                        self.db.execute("INSERT OR REPLACE INTO conversations (name, key, uid, state) "
+                                        "VALUES (?, ?, ?, ?)", (op[1], op[2], op[3], op[4]))
+        return job
+
+    def commit(self, ops):
+        self.prepare(ops)()
+
+    async def get_user_data(self):
+        out = {uid: json.loads(data) for uid, data in self.db.execute(
+            "SELECT uid, data FROM user_data WHERE uid IN (SELECT uid FROM conversations)")}
+        for uid, cid in self.contests.items():
+            out.setdefault(uid, {}).setdefault("contest", cid)
+        return out
+
+    async def get_conversations(self, name):
+        out = {}
+        for key, uid, state in self.db.execute(
+                "SELECT key, uid, state FROM conversations WHERE name = ?", (name,)):
+            out[tuple(json.loads(key))] = json.loads(state)
+            self.active.add(uid)
+        return out
+
+    async def update_conversation(self, name, key, new_state):
+        # Ключ разговора — (chat_id, user_id): user_data хранится, пока разговор идёт
+        uid = key[-1] if key else None
+        if new_state is None:
+            self.active.discard(uid)
+        else:
+            self.active.add(uid)
+        self.writer.post(("conv", name, json.dumps(list(key)), uid,
+                          None if new_state is None else json.dumps(new_state)))
 
+    async def update_user_data(self, user_id, data):
+        cid = data.get("contest") if data else None
+        if cid and self.contests.get(user_id) != cid:
+            self.contests[user_id] = cid
+            self.writer.post(("contest", user_id, cid))
+        self.writer.post(("user", user_id, json.dumps(data, ensure_ascii=False) if data else None))
 
-# ── ДЕДЛАЙН ───────────────────────────────────────────────────────────────────
+    async def drop_user_data(self, user_id):
+        self.writer.post(("user", user_id, None))
+
+    async def flush(self):
+        # Application вызывает flush при остановке, после последнего update_*
+        await self.writer.stop()
+
+    async def get_chat_data(self):
+        return {}
 
-def get_deadline():
-    cfg = load(CONFIG_FILE)
-    ts  = cfg.get("deadline_utc")
-    return datetime.fromisoformat(ts) if ts else DEFAULT_DEADLINE
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+
+SESSIONS = SessionStore(SESSION_FILE) if SESSION_FILE else None
+
+
+# ── ДЕДЛАЙН ───────────────────────────────────────────────────────────────────
 
-def voting_open():
-    dl  = get_deadline()
+class Settings:
+    """Настройки в памяти: читаются один раз и правятся на месте.
+
+    Внешние правки (config.json руками, другой процесс) подхватываются не чаще
+    раза в CONFIG_RECHECK секунд по дешёвой отметке хранилища — mtime файла
+    или PRAGMA data_version.
+    """
+
+    def __init__(self, store, default_deadline):
+        self.store    = store
+        self.cfg      = {}
+        self.default  = default_deadline
+        self.deadline = default_deadline
+        self.closed   = False     # голосование закрыто задачей close_voting
+        self._stamp   = object()
+        self._checked = float("-inf")
+
+    def refresh(self):
+        now = time.monotonic()
+        if now - self._checked < CONFIG_RECHECK:
+            return
+        self._checked = now
+        stamp = self.store.config_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._apply(self.store.get_config())
+
+    def _apply(self, cfg):
+        self.cfg      = cfg
+        ts            = cfg.get("deadline_utc")
+        self.deadline = datetime.fromisoformat(ts) if ts else self.default
+
+    async def update(self, **changes):
+        """Меняет ключи настроек (None — удалить) и ждёт, пока они сохранятся."""
+        # Настройки пишутся целиком — сначала подхватываем чужие правки
+        self._checked = float("-inf")
+        self.refresh()
+        cfg = dict(self.cfg)
+        for k, v in changes.items():
+            if v is None: cfg.pop(k, None)
+            else: cfg[k] = v
+        self._apply(cfg)
+        await self.store.set_config(cfg)
+        self._stamp = self.store.config_stamp()
+
+
+def get_deadline(c):
+    c.settings.refresh()
+    return c.settings.deadline
+
+def voting_is_open(c):
+    return not c.settings.closed and datetime.now(timezone.utc) < get_deadline(c)
+
+def voting_open(c):
+    dl  = get_deadline(c)
     now = datetime.now(timezone.utc)
-    if now >= dl:
+    if c.settings.closed or now >= dl:
         dl_msk = (dl + timedelta(hours=3)).strftime("%d.%m.%Y, %H:%M")
         return False, f"Приём прогнозов завершён · {dl_msk} МСК"
     left = dl - now
@@ -97,15 +1653,101 @@ def voting_open():
     return True, remaining
 
 
+# ── КНОПКИ ────────────────────────────────────────────────────────────────────
+#
+# callback_data: версия формата, буква действия, числовые аргументы через
+# точку и id конкурса — "2p3.2@oscar" значит «прогноз в oscar, категория 3,
+# вариант 2». Категории передаются номером, а не id, поэтому данные короткие
+# при любых id и разбираются без split по "_". Кнопки под старыми
+# сообщениями с другой версией формата отсекаются на первом символе, кнопки
+# другого конкурса (пользователь с тех пор сделал /start <id>) и номера вне
+# списка номинантов уходят в stale_button.
+#
+#   p <кат> <вар>  прогноз          a <кат> <вар>  админ: победитель
+#   w <кат> <вар>  пожелание        c <кат>        админ: категория
+#   b <кат>        ← Назад          x              админ: ← к категориям
+#   r              изменить ответы  d              админ: готово
+#   s              мои ответы
+
+CB_VERSION = "2"
+CB_ARITY   = {"p": 2, "w": 2, "b": 1, "r": 0, "s": 0, "a": 2, "c": 1, "x": 0, "d": 0}
+# Кнопки шага опроса: годятся, только пока пользователь на той же категории
+CB_STEP    = {"p", "w", "b"}
+
+def cb(c, op, *args):
+    return f"{CB_VERSION}{op}{'.'.join(map(str, args))}@{c.id}"
+
+def decode_cb(data):
+    """(конкурс, действие, аргументы) из callback_data или None для старого или битого формата."""
+    if not data or data[0] != CB_VERSION or len(data) < 2:
+        return None
+    body, _, cid = data.partition("@")
+    op, rest = body[1], body[2:]
+    args = rest.split(".") if rest else ()
+    # isdigit отсекает и минус, и мусор; isascii — цифры вроде «²», которых не понимает int()
+    if not cid or CB_ARITY.get(op) != len(args) or not all(x.isascii() and x.isdigit() for x in args):
+        return None
+    return cid, op, tuple(map(int, args))
+
+def _cb_fits(c, op, args):
+    """Номера категории и варианта из кнопки есть в конкурсе c."""
+    if not args:
+        return True
+    i = args[0]
+    # ← Назад с первой категории не бывает: кнопка есть только у следующих
+    if not (1 if op == "b" else 0) <= i < c.total:
+        return False
+    return len(args) < 2 or args[1] < len(c.categories[i]["options"])
+
+class CallbackRouter(BaseHandler):
+    """Кнопки одного состояния разговора: данные разбираются один раз,
+    хендлер выбирается по букве действия, аргументы приходят в ctx.args."""
+
+    def __init__(self, routes):
+        super().__init__(self.dispatch)
+        self.routes = routes
+
+    def check_update(self, update):
+        if isinstance(update, Update) and update.callback_query:
+            parsed = decode_cb(update.callback_query.data)
+            if parsed and parsed[1] in self.routes:
+                c = CONTESTS.get(parsed[0])
+                if c is not None and _cb_fits(c, parsed[1], parsed[2]):
+                    return parsed
+        return None
+
+    def collect_additional_context(self, context, update, application, check_result):
+        context.args = check_result
+
+    async def dispatch(self, update, ctx):
+        cid, op, ctx.args = ctx.args
+        # Кнопка конкурса, из которого пользователь уже ушёл, или с другого шага
+        # опроса (старое сообщение); шаг разговора не меняем
+        if cid != contest_of(ctx).id or (op in CB_STEP and ctx.args[0] != ctx.user_data.get("idx", 0)):
+            await stale_button(update, ctx)
+            return None
+        return await self.routes[op](update, ctx)
+
+
 # ── КЛАВИАТУРЫ ────────────────────────────────────────────────────────────────
 
-def make_keyboard(cat_index, mode):
+# Номинации конкурса не меняются, поэтому клавиатуры и заголовки вопросов
+# собираются один раз при загрузке конкурса; объекты telegram неизменяемы
+# и спокойно переиспользуются.
+
+def _build_keyboard(c, cat_index, mode):
     rows = [
-        [InlineKeyboardButton(opt, callback_data=f"{mode}_{cat_index}_{i}")]
-        for i, opt in enumerate(CATEGORIES[cat_index]["options"])
+        [InlineKeyboardButton(opt, callback_data=cb(c, mode[0], cat_index, i))]
+        for i, opt in enumerate(c.categories[cat_index]["options"])
     ]
     if cat_index > 0:
-        rows.append([InlineKeyboardButton("← Назад", callback_data=f"back_{mode}_{cat_index}")])
+        rows.append([InlineKeyboardButton("← Назад", callback_data=cb(c, "b", cat_index))])
+    return InlineKeyboardMarkup(rows)
+
+def _build_admin_win_keyboard(c, cat_index):
+    rows = [[InlineKeyboardButton(opt, callback_data=cb(c, "a", cat_index, i))]
+            for i, opt in enumerate(c.categories[cat_index]["options"])]
+    rows.append([InlineKeyboardButton("← Назад", callback_data=cb(c, "x"))])
     return InlineKeyboardMarkup(rows)
 
 async def send_or_edit(update, text, markup):
@@ -117,57 +1759,231 @@ async def send_or_edit(update, text, markup):
 
 # ── ВОПРОСЫ ───────────────────────────────────────────────────────────────────
 
+def _header(c, idx):
+    return f"*{c.categories[idx]['title'].upper()}*\n_{idx + 1} / {c.total}_\n\n"
+
+def _wish_text(c, idx, predicted):
+    return (
+        f"{_header(c, idx)}"
+        f"Ваш прогноз: `{predicted}`\n\n"
+        f"✦  А кого вы хотели бы видеть победителем?"
+    )
+
 async def ask_predict(update, ctx):
+    c   = contest_of(ctx)
     idx = ctx.user_data.get("idx", 0)
-    if idx >= TOTAL:
+    if idx >= c.total:
         return await finish(update, ctx)
-    cat  = CATEGORIES[idx]
-    step = f"{idx + 1} / {TOTAL}"
-    text = (
-        f"*{cat['title'].upper()}*\n"
-        f"_{step}_\n\n"
-        f"★  Кто, на ваш взгляд, получит статуэтку?"
-    )
-    await send_or_edit(update, text, make_keyboard(idx, "predict"))
+    await send_or_edit(update, c.predict_texts[idx], c.keyboards[idx, "predict"])
     return PREDICT
 
-async def ask_wish(update, ctx, predicted):
-    idx  = ctx.user_data.get("idx", 0)
-    cat  = CATEGORIES[idx]
-    step = f"{idx + 1} / {TOTAL}"
-    text = (
-        f"*{cat['title'].upper()}*\n"
-        f"_{step}_\n\n"
-        f"Ваш прогноз: `{predicted}`\n\n"
-        f"✦  А кого вы хотели бы видеть победителем?"
-    )
-    await send_or_edit(update, text, make_keyboard(idx, "wish"))
+async def ask_wish(update, ctx, idx, opt_i):
+    # Категория — из той же кнопки, что и вариант: номер варианта имеет смысл только в ней
+    c = contest_of(ctx)
+    await send_or_edit(update, c.wish_texts[idx][opt_i], c.keyboards[idx, "wish"])
     return WISH
 
 
+# ── КОНКУРСЫ (реестр) ─────────────────────────────────────────────────────────
+
+CONTEST_ID = re.compile(r"^[a-z0-9_]{1,32}$")
+
+class Contest:
+    """Конкурс: номинации и всё, что из них следует, плюс своё хранилище.
+
+    Категории по id, клавиатуры и тексты вопросов (в том числе «Ваш прогноз»
+    для каждого варианта) считаются один раз при загрузке; номер варианта по
+    названию знают Ballots и Tallies хранилища конкурса. Голоса, результаты и
+    настройки — в отдельном хранилище конкурса (файлы с суффиксом или своя
+    база), так что запись в одном конкурсе не переписывает и не блокирует
+    данные другого.
+    """
+
+    def __init__(self, cid, spec):
+        self.id         = cid
+        self.title      = spec["title"]
+        self.subtitle   = spec.get("subtitle", "")
+        self.ceremony   = spec.get("ceremony", "")
+        self.question   = spec.get("question", "Кто, на ваш взгляд, победит?")
+        self.categories = spec["categories"]
+        self.total      = len(self.categories)
+        self.cat_by_id  = {cat["id"]: cat for cat in self.categories}
+
+        self.keyboards = {(i, mode): _build_keyboard(self, i, mode)
+                          for i in range(self.total) for mode in ("predict", "wish")}
+        self.predict_texts = [f"{_header(self, i)}★  {self.question}" for i in range(self.total)]
+        self.wish_texts    = [[_wish_text(self, i, opt) for opt in cat["options"]]
+                              for i, cat in enumerate(self.categories)]
+        self.admin_win_keyboards = [_build_admin_win_keyboard(self, i) for i in range(self.total)]
+        self.admin_cat_keyboards = {}   # frozenset категорий с результатом -> клавиатура
+
+        self.store     = make_store(cid, self.categories)
+        self.settings  = Settings(self.store, datetime.fromisoformat(spec["deadline_utc"]))
+        self.responses = ResponseCache(RESPONSE_CACHE_SIZE)
+        self.frozen    = None       # Frozen, когда голосование закрыто
+        self.broadcast = Broadcast(self)
+        self._synced   = float("-inf")
+
+    @staticmethod
+    def check(cid, spec):
+        """Описание конкурса без ошибок, которые иначе всплыли бы посреди голосования."""
+        ids = [cat.get("id") for cat in spec.get("categories", ())]
+        if not spec.get("title") or not ids or "deadline_utc" not in spec:
+            raise ValueError(f"{cid}: нужны title, deadline_utc и categories")
+        if len(set(ids)) != len(ids):
+            raise ValueError(f"{cid}: id категорий повторяются")
+        for cat in spec["categories"]:
+            # Номер варианта хранится в int8 матрицы бюллетеней
+            if not 0 < len(cat.get("options", ())) <= 127:
+                raise ValueError(f"{cid}/{cat['id']}: от 1 до 127 вариантов")
+
+    def open(self):
+        self.store.open()
+        logger.info("Конкурс %s: %s, категорий %d", self.id, self.title, self.total)
+
+    def start(self, app):
+        self.store.start()
+        if WORKER_INDEX == 0:
+            # Прерванную рестартом рассылку продолжает один процесс из WORKERS
+            self.broadcast.resume(app.bot)
+        schedule_close(self, app.job_queue)
+
+    def sync(self):
+        """Голоса и результаты соседних процессов — не чаще раза в SYNC_INTERVAL сек."""
+        now = time.monotonic()
+        if now - self._synced < SYNC_INTERVAL:
+            return
+        self._synced = now
+        if self.store.sync():
+            if self.frozen:
+                self.frozen = Frozen(self)
+            self.responses.bump()
+
+    async def stop(self):
+        await self.broadcast.stop()
+        await self.store.stop()
+
+
+class Contests:
+    """Реестр конкурсов.
+
+    Файл конкурса читается, а его хранилище открывается при первом обращении
+    к конкурсу, так что память и время запуска растут с числом конкурсов,
+    в которых сейчас участвуют, а не с числом файлов в CONTESTS_DIR.
+    """
+
+    def __init__(self, directory):
+        self.dir    = directory
+        self.loaded = {}
+        self.app    = None        # после post_init новые конкурсы сразу запускаются
+
+    def path(self, cid):
+        return os.path.join(self.dir, f"{cid}.json")
+
+    def get(self, cid):
+        """Конкурс cid, загруженный при необходимости; None — такого нет."""
+        c = self.loaded.get(cid)
+        if c is not None:
+            return c
+        spec = self.spec(cid)
+        if spec is None:
+            return None
+        c = self.loaded[cid] = Contest(cid, spec)
+        c.open()
+        if self.app:
+            c.start(self.app)
+        return c
+
+    def spec(self, cid):
+        """Описание конкурса из файла; None — файла нет или в нём ошибка."""
+        if not CONTEST_ID.match(cid or "") or not os.path.exists(self.path(cid)):
+            return None
+        try:
+            spec = load(self.path(cid))
+            Contest.check(cid, spec)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error("Конкурс %s не загружен: %s", cid, e)
+            return None
+        return spec
+
+    @property
+    def default(self):
+        c = self.get(DEFAULT_CONTEST)
+        if c is None:
+            raise RuntimeError(f"Нет описания конкурса по умолчанию: {self.path(DEFAULT_CONTEST)}")
+        return c
+
+    def available(self):
+        """(id, название) всех описанных конкурсов — читает только незагруженные файлы."""
+        out = []
+        for name in sorted(os.listdir(self.dir)):
+            cid, ext = os.path.splitext(name)
+            if ext != ".json" or not CONTEST_ID.match(cid):
+                continue
+            c    = self.loaded.get(cid)
+            spec = None if c else self.spec(cid)
+            if c or spec:
+                out.append((cid, c.title if c else spec["title"]))
+        return out
+
+    def start(self, app):
+        self.app = app
+        for c in list(self.loaded.values()):
+            c.start(app)
+
+    async def stop(self):
+        for c in list(self.loaded.values()):
+            await c.stop()
+
+
+CONTESTS = Contests(CONTESTS_DIR)
+
+def contest_of(ctx):
+    """Конкурс, выбранный пользователем через /start <id>, иначе конкурс по умолчанию."""
+    c = CONTESTS.get(ctx.user_data.get("contest")) or CONTESTS.default
+    c.sync()
+    return c
+
+
 # ── ГОЛОСОВАНИЕ ───────────────────────────────────────────────────────────────
 
+def _contest_list():
+    return "\n".join(f"`/start {cid}` — {title}" for cid, title in CONTESTS.available())
+
+async def contests(update, ctx):
+    """Список конкурсов и тот, в котором пользователь сейчас."""
+    await update.message.reply_text(
+        f"Сейчас: *{contest_of(ctx).title}*\n\n{_contest_list()}", parse_mode="Markdown")
+
 async def start(update, ctx):
+    if ctx.args:
+        # /start bafta или ссылка t.me/<бот>?start=bafta
+        if CONTESTS.get(ctx.args[0]) is None:
+            await update.message.reply_text(
+                "Такого конкурса нет.\n\n" + _contest_list(), parse_mode="Markdown")
+            return ConversationHandler.END
+        ctx.user_data["contest"] = ctx.args[0]
+    c     = contest_of(ctx)
     user  = update.effective_user
     uid   = str(user.id)
-    open_, info = voting_open()
-    entry = load(DATA_FILE).get(uid, {})
+    open_, info = voting_open(c)
+    entry = c.store.get(uid, {})
 
     if entry.get("completed"):
         if open_:
             keyboard = InlineKeyboardMarkup([[
-                InlineKeyboardButton("Изменить прогнозы", callback_data="revote"),
-                InlineKeyboardButton("Мои ответы",        callback_data="showvotes"),
+                InlineKeyboardButton("Изменить прогнозы", callback_data=cb(c, "r")),
+                InlineKeyboardButton("Мои ответы",        callback_data=cb(c, "s")),
             ]])
             await update.message.reply_text(
-                f"*OSCAR 2026*\n\n"
+                f"*{c.title}*\n\n"
                 f"Ваши прогнозы уже записаны.\n"
                 f"До закрытия голосования: *{info}*\n\n"
                 f"Можете изменить ответы или просмотреть их:",
                 reply_markup=keyboard, parse_mode="Markdown")
         else:
             await update.message.reply_text(
-                f"*OSCAR 2026*\n\n{info}\n\n"
+                f"*{c.title}*\n\n{info}\n\n"
                 "/my\\_votes — ваши прогнозы\n"
                 "/leaderboard — таблица лидеров",
                 parse_mode="Markdown")
@@ -175,17 +1991,17 @@ async def start(update, ctx):
 
     if not open_:
         await update.message.reply_text(
-            f"*OSCAR 2026*\n\n{info}\n\nПринять участие уже не получится.",
+            f"*{c.title}*\n\n{info}\n\nПринять участие уже не получится.",
             parse_mode="Markdown")
         return ConversationHandler.END
 
     deadline_line = f"Приём прогнозов закрывается через *{info}*\n\n" if info else ""
     await update.message.reply_text(
-        f"*OSCAR 2026*\n"
-        f"_98-я церемония · 15 марта 2026_\n\n"
+        f"*{c.title}*\n"
+        f"_{c.subtitle}_\n\n"
         f"{DIVIDER}\n\n"
         f"{deadline_line}"
-        f"Для каждой из *{TOTAL} категорий* — два вопроса:\n\n"
+        f"Для каждой из *{c.total} категорий* — два вопроса:\n\n"
         f"★  Кто победит? — учитывается в рейтинге\n"
         f"✦  Кого хотите видеть? — для интереса\n\n"
         f"{DIVIDER}\n\n"
@@ -196,35 +2012,27 @@ async def start(update, ctx):
 
 async def handle_back(update, ctx):
     """Кнопка ← Назад."""
-    query = update.callback_query
-    await query.answer()
-    _, mode, idx_str = query.data.split("_")
-    idx = int(idx_str) - 1
+    await update.callback_query.answer()
+    idx = ctx.args[0] - 1
     ctx.user_data["idx"] = idx
 
-    # Откатываем последний записанный ответ
-    cat = CATEGORIES[idx]
-    if mode == "predict":
-        ctx.user_data["predictions"].pop(cat["id"], None)
-        return await ask_predict(update, ctx)
-    else:  # wish — возвращаемся к predict этой же категории
-        ctx.user_data["predictions"].pop(cat["id"], None)
-        return await ask_predict(update, ctx)
+    # Откатываем прогноз предыдущей категории и спрашиваем его заново —
+    # одинаково с шага прогноза и с шага пожелания
+    cat = contest_of(ctx).categories[idx]
+    ctx.user_data["predictions"].pop(cat["id"], None)
+    return await ask_predict(update, ctx)
 
 async def handle_predict(update, ctx):
     await update.callback_query.answer()
-    _, idx_str, opt_i_str = update.callback_query.data.split("_")
-    idx, opt_i = int(idx_str), int(opt_i_str)
-    cat    = CATEGORIES[idx]
-    chosen = cat["options"][opt_i]
-    ctx.user_data["predictions"][cat["id"]] = chosen
-    return await ask_wish(update, ctx, chosen)
+    idx, opt_i = ctx.args
+    cat    = contest_of(ctx).categories[idx]
+    ctx.user_data["predictions"][cat["id"]] = cat["options"][opt_i]
+    return await ask_wish(update, ctx, idx, opt_i)
 
 async def handle_wish(update, ctx):
     await update.callback_query.answer()
-    _, idx_str, opt_i_str = update.callback_query.data.split("_")
-    idx, opt_i = int(idx_str), int(opt_i_str)
-    cat = CATEGORIES[idx]
+    idx, opt_i = ctx.args
+    cat = contest_of(ctx).categories[idx]
     ctx.user_data["wishes"][cat["id"]] = cat["options"][opt_i]
     ctx.user_data["idx"] = idx + 1
     return await ask_predict(update, ctx)
@@ -232,8 +2040,7 @@ async def handle_wish(update, ctx):
 async def handle_revote(update, ctx):
     query = update.callback_query
     await query.answer()
-    open_, _ = voting_open()
-    if not open_:
+    if not voting_is_open(contest_of(ctx)):
         await query.edit_message_text("Голосование уже закрыто — изменить прогнозы нельзя.")
         return ConversationHandler.END
     ctx.user_data.update({"idx": 0, "predictions": {}, "wishes": {}})
@@ -243,12 +2050,13 @@ async def handle_revote(update, ctx):
 async def handle_showvotes(update, ctx):
     query = update.callback_query
     await query.answer()
+    c     = contest_of(ctx)
     uid   = str(query.from_user.id)
-    entry = load(DATA_FILE).get(uid, {})
+    entry = c.store.get(uid, {})
     preds  = entry.get("predictions", {})
     wishes = entry.get("wishes", {})
     lines  = []
-    for cat in CATEGORIES:
+    for cat in c.categories:
         p = preds.get(cat["id"],  "—")
         w = wishes.get(cat["id"], "—")
         match = " ·  совпадает" if p == w else ""
@@ -259,17 +2067,21 @@ async def handle_showvotes(update, ctx):
     return ConversationHandler.END
 
 async def finish(update, ctx):
+    c    = contest_of(ctx)
     user = update.effective_user
     uid  = str(user.id)
     predictions = ctx.user_data.get("predictions", {})
     wishes      = ctx.user_data.get("wishes", {})
-    votes = load(DATA_FILE)
-    is_revote = votes.get(uid, {}).get("completed", False)
-    votes[uid] = {"name": user.first_name, "username": user.username or "",
-                  "predictions": predictions, "wishes": wishes, "completed": True}
-    save(DATA_FILE, votes)
+    if c.store.frozen:
+        msg = update.callback_query.message if update.callback_query else update.message
+        await msg.reply_text("Голосование закрыто — эти прогнозы уже не сохранить.")
+        return ConversationHandler.END
+    is_revote = c.store.get(uid, {}).get("completed", False)
+    await c.store.put(uid, {"name": user.first_name, "username": user.username or "",
+                            "predictions": predictions, "wishes": wishes, "completed": True})
+    c.responses.bump()
     lines = []
-    for cat in CATEGORIES:
+    for cat in c.categories:
         p = predictions.get(cat["id"], "—")
         w = wishes.get(cat["id"],      "—")
         match = " ·  совпадает" if p == w else ""
@@ -280,30 +2092,35 @@ async def finish(update, ctx):
         f"*{prefix.upper()}*\n\n" +
         f"\n{DIVIDER}\n".join(lines) +
         f"\n\n{DIVIDER}\n\n"
-        f"_Церемония — 15 марта 2026_\n"
+        f"_Церемония — {c.ceremony}_\n"
         f"После объявления победителей: /leaderboard",
         parse_mode="Markdown")
     return ConversationHandler.END
 
+async def stale_button(update, ctx):
+    """Кнопка под старым сообщением или из завершённого разговора."""
+    await update.callback_query.answer("Эта кнопка устарела — /start, чтобы начать заново.")
+
 async def cancel(update, ctx):
     await update.message.reply_text("Голосование прервано. /start — начать заново.")
     return ConversationHandler.END
 
 async def my_votes(update, ctx):
+    c     = contest_of(ctx)
     uid   = str(update.effective_user.id)
-    entry = load(DATA_FILE).get(uid)
+    entry = c.store.get(uid)
     if not entry:
         await update.message.reply_text("Вы ещё не голосовали. /start — начать.")
         return
     preds  = entry.get("predictions", {})
     wishes = entry.get("wishes", {})
     lines  = []
-    for cat in CATEGORIES:
+    for cat in c.categories:
         p = preds.get(cat["id"],  "—")
         w = wishes.get(cat["id"], "—")
         match = " ·  совпадает" if p == w else ""
         lines.append(f"*{cat['title'].upper()}*\n  ★  `{p}`\n  ✦  `{w}`{match}")
-    open_, info = voting_open()
+    open_, info = voting_open(c)
     footer = f"\n\n_{('До закрытия: ' + info) if open_ and info else 'Голосование закрыто.'}_"
     await update.message.reply_text(
         "ВАШИ ПРОГНОЗЫ\n\n" + f"\n{DIVIDER}\n".join(lines) + footer,
@@ -312,73 +2129,78 @@ async def my_votes(update, ctx):
 
 # ── ADMIN — ввод результатов ──────────────────────────────────────────────────
 
-def _admin_cat_keyboard(results):
-    rows = []
-    for cat in CATEGORIES:
-        mark = "✓  " if cat["id"] in results else "·  "
-        rows.append([InlineKeyboardButton(mark + cat["title"], callback_data=f"acat_{cat['id']}")])
-    rows.append([InlineKeyboardButton("— Готово —", callback_data="adone")])
-    return InlineKeyboardMarkup(rows)
-
-def _admin_win_keyboard(cat_id):
-    cat  = next(c for c in CATEGORIES if c["id"] == cat_id)
-    rows = [[InlineKeyboardButton(opt, callback_data=f"awin_{cat_id}_{i}")]
-            for i, opt in enumerate(cat["options"])]
-    rows.append([InlineKeyboardButton("← Назад", callback_data="aback")])
-    return InlineKeyboardMarkup(rows)
+def _admin_cat_keyboard(c):
+    done = frozenset(k for k in c.store.results if k in c.cat_by_id)
+    kb   = c.admin_cat_keyboards.get(done)
+    if kb is None:
+        rows = []
+        for i, cat in enumerate(c.categories):
+            mark = "✓  " if cat["id"] in done else "·  "
+            rows.append([InlineKeyboardButton(mark + cat["title"], callback_data=cb(c, "c", i))])
+        rows.append([InlineKeyboardButton("— Готово —", callback_data=cb(c, "d"))])
+        kb = c.admin_cat_keyboards[done] = InlineKeyboardMarkup(rows)
+    return kb
 
 async def admin(update, ctx):
     uid = update.effective_user.id
     if ADMIN_IDS and uid not in ADMIN_IDS:
         await update.message.reply_text("Доступ закрыт.")
         return ConversationHandler.END
-    results = load(RESULTS_FILE)
+    c = contest_of(ctx)
     await update.message.reply_text(
-        f"*ВВОД РЕЗУЛЬТАТОВ*  ·  {len(results)}/{TOTAL}\n\nВыберите категорию:",
-        reply_markup=_admin_cat_keyboard(results), parse_mode="Markdown")
+        f"*ВВОД РЕЗУЛЬТАТОВ · {c.title}*  ·  {len(c.store.results)}/{c.total}\n\nВыберите категорию:",
+        reply_markup=_admin_cat_keyboard(c), parse_mode="Markdown")
     return ADMIN_CAT
 
+async def admin_done(update, ctx):
+    query = update.callback_query
+    await query.answer()
+    c       = contest_of(ctx)
+    results = c.store.results
+    lines   = "\n".join(
+        f"·  {c.cat_by_id[k]['title']}: `{v}`"
+        for k,v in results.items())
+    await query.edit_message_text(
+        f"*ИТОГО {len(results)}/{c.total}*\n\n{lines or '—'}\n\n_/leaderboard доступен всем_\n"
+        f"/broadcast — разослать участникам их результаты",
+        parse_mode="Markdown")
+    return ConversationHandler.END
+
 async def admin_pick_cat(update, ctx):
     query = update.callback_query
     await query.answer()
-    if query.data == "adone":
-        results = load(RESULTS_FILE)
-        lines   = "\n".join(
-            f"·  {next(c['title'] for c in CATEGORIES if c['id']==k)}: `{v}`"
-            for k,v in results.items())
-        await query.edit_message_text(
-            f"*ИТОГО {len(results)}/{TOTAL}*\n\n{lines or '—'}\n\n_/leaderboard доступен всем_",
-            parse_mode="Markdown")
-        return ConversationHandler.END
-    cat_id  = query.data[len("acat_"):]
-    cat     = next(c for c in CATEGORIES if c["id"] == cat_id)
-    results = load(RESULTS_FILE)
-    note    = f"\n_Сейчас: {results[cat_id]}_" if cat_id in results else ""
+    c       = contest_of(ctx)
+    idx,    = ctx.args
+    cat     = c.categories[idx]
+    results = c.store.results
+    note    = f"\n_Сейчас: {results[cat['id']]}_" if cat["id"] in results else ""
     await query.edit_message_text(
         f"*{cat['title'].upper()}*{note}\n\nКто победил?",
-        reply_markup=_admin_win_keyboard(cat_id), parse_mode="Markdown")
+        reply_markup=c.admin_win_keyboards[idx], parse_mode="Markdown")
     return ADMIN_WIN
 
+async def admin_back(update, ctx):
+    query = update.callback_query
+    await query.answer()
+    c = contest_of(ctx)
+    await query.edit_message_text(
+        f"*ВВОД РЕЗУЛЬТАТОВ · {c.title}*  ·  {len(c.store.results)}/{c.total}\n\nВыберите категорию:",
+        reply_markup=_admin_cat_keyboard(c), parse_mode="Markdown")
+    return ADMIN_CAT
+
 async def admin_pick_winner(update, ctx):
     query = update.callback_query
     await query.answer()
-    if query.data == "aback":
-        results = load(RESULTS_FILE)
-        await query.edit_message_text(
-            f"*ВВОД РЕЗУЛЬТАТОВ*  ·  {len(results)}/{TOTAL}\n\nВыберите категорию:",
-            reply_markup=_admin_cat_keyboard(results), parse_mode="Markdown")
-        return ADMIN_CAT
-    parts   = query.data.split("_")
-    opt_i   = int(parts[-1])
-    cat_id  = "_".join(parts[1:-1])
-    cat     = next(c for c in CATEGORIES if c["id"] == cat_id)
-    winner  = cat["options"][opt_i]
-    results = load(RESULTS_FILE)
-    results[cat_id] = winner
-    save(RESULTS_FILE, results)
+    c      = contest_of(ctx)
+    idx, opt_i = ctx.args
+    cat    = c.categories[idx]
+    cat_id = cat["id"]
+    winner = cat["options"][opt_i]
+    await c.store.set_result(cat_id, winner)
+    c.responses.bump()
     await query.edit_message_text(
-        f"*{cat['title'].upper()}*\n`{winner}`\n\n{len(results)}/{TOTAL} введено:",
-        reply_markup=_admin_cat_keyboard(results), parse_mode="Markdown")
+        f"*{cat['title'].upper()}*\n`{winner}`\n\n{len(c.store.results)}/{c.total} введено:",
+        reply_markup=_admin_cat_keyboard(c), parse_mode="Markdown")
     return ADMIN_CAT
 
 async def admin_cancel(update, ctx):
@@ -388,147 +2210,445 @@ async def admin_cancel(update, ctx):
 
 # ── РЕЙТИНГ / СТАТИСТИКА ──────────────────────────────────────────────────────
 
+class ResponseCache:
+    """Готовые тексты ответов, привязанные к версии данных.
+
+    У каждого конкурса свой кэш. Версию поднимают finish() и admin_pick_winner();
+    пока новых записей нет, одинаковые запросы получают уже отрисованный текст.
+    Старые версии вытесняются сами — кэш ограничен и выкидывает давно не читанное.
+    """
+
+    def __init__(self, size):
+        self.size    = size
+        self.version = 0
+        self.hits    = 0
+        self.misses  = 0
+        self._items  = OrderedDict()
+
+    def bump(self):
+        self.version += 1
+
+    def get(self, key, render):
+        key  = (self.version,) + key
+        text = self._items.get(key)
+        if text is not None:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return text
+        self.misses += 1
+        text = self._items[key] = render()
+        if len(self._items) > self.size:
+            self._items.popitem(last=False)
+        return text
+
+
+def _render_leaderboard(c):
+    results = c.store.results
+    graded  = len(results)
+    place   = ["I", "II", "III"]
+    lines   = []
+    board   = c.store.board
+    for i, r in enumerate(board.top(20)):
+        name, username   = c.store.voter(r)
+        correct, wish_ok = board.correct[r], board.wish_ok[r]
+        tag  = f"@{username}" if username else name
+        rank = place[i] if i < 3 else f"{i+1}."
+        pct  = round(100*correct/graded) if graded else 0
+        wish = f"  ·  ✦ {wish_ok}/{graded}" if wish_ok else ""
+        lines.append(f"`{rank}`  {tag} — ★ {correct}/{graded} ({pct}%){wish}")
+    dreamer = ""
+    d = board.dreamer()
+    if d is not None:
+        name, username = c.store.voter(d)
+        wish_ok = board.wish_ok[d]
+        tag = f"@{username}" if username else name
+        dreamer = f"\n\n_Лучший мечтатель: {tag} · {wish_ok}/{graded} желаний сбылось_"
+    return (f"*РЕЙТИНГ · {c.title}*  ·  {graded}/{c.total} категорий\n\n" +
+            ("\n".join(lines) or "Никто не проголосовал.") + dreamer)
+
 async def leaderboard(update, ctx):
-    results = load(RESULTS_FILE)
-    votes   = load(DATA_FILE)
-    if not results:
+    c = contest_of(ctx)
+    if not c.store.results:
         await update.message.reply_text(
-            "*OSCAR 2026*\n\nРезультаты ещё не объявлены.\nПриходите после 15 марта.",
+            f"*{c.title}*\n\nРезультаты ещё не объявлены.\nПриходите после церемонии — {c.ceremony}.",
             parse_mode="Markdown")
         return
-    graded = len(results)
-    scores = []
-    for uid, data in votes.items():
-        if not data.get("completed"): continue
-        preds   = data.get("predictions", {})
-        wishes  = data.get("wishes", {})
-        correct = sum(1 for cid,w in results.items() if preds.get(cid,"").strip().lower()==w.strip().lower())
-        wish_ok = sum(1 for cid,w in results.items() if wishes.get(cid,"").strip().lower()==w.strip().lower())
-        scores.append({"name": data.get("name","—"), "username": data.get("username",""),
-                       "correct": correct, "wish_ok": wish_ok, "total": graded,
-                       "pct": round(100*correct/graded) if graded else 0})
-    scores.sort(key=lambda x: x["correct"], reverse=True)
-    place = ["I", "II", "III"]
-    lines = []
-    for i, s in enumerate(scores[:20]):
-        tag  = f"@{s['username']}" if s["username"] else s["name"]
-        rank = place[i] if i < 3 else f"{i+1}."
-        wish = f"  ·  ✦ {s['wish_ok']}/{s['total']}" if s["wish_ok"] else ""
-        lines.append(f"`{rank}`  {tag} — ★ {s['correct']}/{s['total']} ({s['pct']}%){wish}")
-    dream = sorted(scores, key=lambda x: x["wish_ok"], reverse=True)
-    dreamer = ""
-    if dream and dream[0]["wish_ok"] > 0:
-        d   = dream[0]
-        tag = f"@{d['username']}" if d["username"] else d["name"]
-        dreamer = f"\n\n_Лучший мечтатель: {tag} · {d['wish_ok']}/{d['total']} желаний сбылось_"
     await update.message.reply_text(
-        f"*РЕЙТИНГ*  ·  {graded}/{TOTAL} категорий\n\n" +
-        ("\n".join(lines) or "Никто не проголосовал.") + dreamer,
-        parse_mode="Markdown")
+        c.responses.get(("leaderboard",), lambda: _render_leaderboard(c)), parse_mode="Markdown")
+
+def _render_stats(c, status):
+    lines = [f"*{c.title} · {c.store.completed_count()} участников*  ·  _{status}_\n"]
+    for cat in c.categories:
+        top_p, top_w = c.store.tallies.top(cat["id"])
+        p_str = "  ·  ".join(f"{k.split('—')[0].strip()} ({v})" for k,v in top_p)
+        w_str = "  ·  ".join(f"{k.split('—')[0].strip()} ({v})" for k,v in top_w)
+        lines.append(f"*{cat['title'].upper()}*\n  ★  {p_str}\n  ✦  {w_str}")
+    return "\n".join(lines)
 
 async def stats(update, ctx):
-    votes = load(DATA_FILE)
-    total_voters = sum(1 for v in votes.values() if v.get("completed"))
-    if not total_voters:
+    c = contest_of(ctx)
+    if c.frozen:
+        await update.message.reply_text(c.frozen.stats or "Никто не проголосовал.", parse_mode="Markdown")
+        return
+    if not c.store.completed_count():
         await update.message.reply_text("Пока никто не проголосовал.")
         return
-    open_, info = voting_open()
+    open_, info = voting_open(c)
     status = f"до закрытия: {info}" if open_ and info else "голосование закрыто"
-    lines  = [f"*{total_voters} участников*  ·  _{status}_\n"]
-    for cat in CATEGORIES:
-        pt, wt = {}, {}
-        for data in votes.values():
-            if not data.get("completed"): continue
-            pp = data.get("predictions",{}).get(cat["id"],"")
-            ww = data.get("wishes",{}).get(cat["id"],"")
-            if pp: pt[pp] = pt.get(pp,0)+1
-            if ww: wt[ww] = wt.get(ww,0)+1
-        top_p = sorted(pt.items(), key=lambda x:-x[1])[:2]
-        top_w = sorted(wt.items(), key=lambda x:-x[1])[:2]
-        p_str = "  ·  ".join(f"{k.split('—')[0].strip()} ({v})" for k,v in top_p)
-        w_str = "  ·  ".join(f"{k.split('—')[0].strip()} ({v})" for k,v in top_w)
-        lines.append(f"*{cat['title'].upper()}*\n  ★  {p_str}\n  ✦  {w_str}")
-    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+    await update.message.reply_text(
+        c.responses.get(("stats", status), lambda: _render_stats(c, status)), parse_mode="Markdown")
+
+
+async def cache_stats(update, ctx):
+    """Попадания и промахи кэша ответов (admin)."""
+    uid = update.effective_user.id
+    if ADMIN_IDS and uid not in ADMIN_IDS:
+        await update.message.reply_text("Доступ закрыт.")
+        return
+    cache = contest_of(ctx).responses
+    total = cache.hits + cache.misses
+    rate  = round(100 * cache.hits / total) if total else 0
+    await update.message.reply_text(
+        f"Кэш ответов · версия данных {cache.version}\n"
+        f"Попаданий: {cache.hits}, промахов: {cache.misses} ({rate}% из кэша)\n"
+        f"Записей: {len(cache._items)}/{cache.size}")
+
+async def storage_stats(update, ctx):
+    """Очередь записи и задержка подтверждения (admin)."""
+    uid = update.effective_user.id
+    if ADMIN_IDS and uid not in ADMIN_IDS:
+        await update.message.reply_text("Доступ закрыт.")
+        return
+    c = contest_of(ctx)
+    w = c.store.writer.stats()
+    await update.message.reply_text(
+        f"Запись на диск · {c.id} · {STORAGE}\n"
+        f"Очередь: {w['depth']} (максимум {w['max_depth']})\n"
+        f"Записано изменений: {w['written']} за {w['commits']} записей, ошибок: {w['failed']}\n"
+        f"Подтверждение: последнее {w['last_ms']:.1f} мс, "
+        f"среднее {w['avg_ms']:.1f} мс, максимум {w['max_ms']:.1f} мс")
+
+
+@METRICS.gauge
+def _runtime_gauges():
+    out = [("oscar_contests_loaded", {}, len(CONTESTS.loaded))]
+    for cid, c in CONTESTS.loaded.items():
+        w, l = c.store.writer.stats(), {"contest": cid}
+        out += [
+            ("oscar_writer_queue_depth",          l, w["depth"]),
+            ("oscar_writer_queue_depth_max",      l, w["max_depth"]),
+            ("oscar_writer_commits_total",        l, w["commits"]),
+            ("oscar_writer_ops_total",            l, w["written"]),
+            ("oscar_writer_failed_total",         l, w["failed"]),
+            ("oscar_writer_ack_seconds_max",      l, w["max_ms"] / 1000),
+            ("oscar_writer_ack_seconds_avg",      l, w["avg_ms"] / 1000),
+            ("oscar_response_cache_hits_total",   l, c.responses.hits),
+            ("oscar_response_cache_misses_total", l, c.responses.misses),
+            ("oscar_voters_completed",            l, c.store.completed_count()),
+        ]
+    out.append(("oscar_flood_tracked_users", {}, len(FLOOD.users)))
+    return out
+
+def _summary(hists, errors_name, label, top=10):
+    lines = []
+    for key, h in sorted(hists.items(), key=lambda kv: -kv[1].sum)[:top]:
+        err = METRICS.counter(errors_name, **{label: key}) if errors_name else 0
+        lines.append(f"  {key}: {h.n} · ошибок {err} · ср. {1000 * h.sum / h.n:.0f} мс"
+                     f" · p95 ≤ {1000 * h.quantile(0.95):.0f} мс")
+    return lines or ["  —"]
+
+async def metrics(update, ctx):
+    """Сводка метрик: хендлеры, Bot API, диск (admin)."""
+    uid = update.effective_user.id
+    if ADMIN_IDS and uid not in ADMIN_IDS:
+        await update.message.reply_text("Доступ закрыт.")
+        return
+    storage = METRICS.series("oscar_storage_seconds", "op")
+    lines = ["Хендлеры (вызовы · ошибки · среднее · p95):"]
+    lines += _summary(METRICS.series("oscar_handler_seconds", "handler"), "oscar_handler_errors_total", "handler")
+    lines += ["", "Bot API:"]
+    lines += _summary(METRICS.series("oscar_bot_api_seconds", "method"), "oscar_bot_api_errors_total", "method")
+    lines += ["", "Диск:"]
+    for op, h in sorted(storage.items()):
+        size = METRICS.counter("oscar_storage_bytes_total", op=op)
+        mib  = f" · {size / 2**20:.1f} MiB" if size else ""
+        lines.append(f"  {op}: {h.n}{mib} · ср. {1000 * h.sum / h.n:.0f} мс · p95 ≤ {1000 * h.quantile(0.95):.0f} мс")
+    lines.append("")
+    for cid, c in CONTESTS.loaded.items():
+        w, cache = c.store.writer.stats(), c.responses
+        total = cache.hits + cache.misses
+        lines.append(f"{cid}: очередь записи {w['depth']} (макс. {w['max_depth']}), "
+                     f"подтверждение в среднем {w['avg_ms']:.1f} мс, "
+                     f"кэш ответов {round(100 * cache.hits / total) if total else 0}%")
+    lines.append(f"Флуд: отброшено {METRICS.counter('oscar_updates_throttled_total', kind='message')} сообщений "
+                 f"и {METRICS.counter('oscar_updates_throttled_total', kind='callback')} нажатий, "
+                 f"повторных нажатий погашено {METRICS.counter('oscar_callbacks_debounced_total')}")
+    if METRICS_PORT:
+        lines.append(f"Prometheus: http://{METRICS_HOST}:{METRICS_PORT + WORKER_INDEX}/metrics")
+    await update.message.reply_text("\n".join(lines))
+
+
+# ── ПРОФИЛИРОВАНИЕ ────────────────────────────────────────────────────────────
+
+class Sampler:
+    """Сэмплирующий профайлер цикла событий, включается командой /profile.
+
+    Таймер ITIMER_PROF раз в INTERVAL секунд процессорного времени присылает
+    SIGPROF, и обработчик записывает стек главного потока, в котором крутится
+    бот. Пока бот ждёт обновлений, процессор не тратится и сэмплов нет;
+    sys.setprofile не нужен, так что хендлеры почти не замедляются.
+    """
+
+    INTERVAL    = 0.005
+    MAX_SECONDS = 600
+
+    def __init__(self):
+        self.running = False
+        self._timer  = None
+        self._prev   = None
+        self.left    = None       # сколько обновлений осталось, если профилируем по числу
+        self.stacks  = Counter()
+
+    def start(self, seconds, updates, on_done):
+        self.stacks  = Counter()
+        self.left    = updates
+        self.running = True
+        self.started = time.monotonic()
+        self.cpu0    = time.process_time()
+        self._done   = on_done
+        self._prev   = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.INTERVAL, self.INTERVAL)
+        self._timer  = asyncio.get_running_loop().call_later(seconds or self.MAX_SECONDS, self.finish)
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def tick(self):
+        if self.running and self.left is not None:
+            self.left -= 1
+            if self.left <= 0:
+                self.finish()
+
+    def finish(self):
+        if not self.running:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._prev)
+        self.running = False
+        self.wall    = time.monotonic() - self.started
+        self.cpu     = time.process_time() - self.cpu0
+        self._timer.cancel()
+        asyncio.get_running_loop().create_task(self._done(self))
+
+    def write(self, path):
+        """Свёрнутые стеки: «кадр;кадр;… число» — строка на уникальный стек."""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+    def top(self, n=10):
+        """[(функция, собственные сэмплы, сэмплы со вложенными)] по собственному времени."""
+        own, total = Counter(), Counter()
+        for stack, k in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += k
+            for fn in set(frames):
+                total[fn] += k
+        return [(fn, k, total[fn]) for fn, k in own.most_common(n)]
+
+
+PROFILER = Sampler()
+
+async def profile(update, ctx):
+    """/profile 30s — профилировать 30 секунд, /profile 200u — 200 обновлений (admin)."""
+    uid = update.effective_user.id
+    if ADMIN_IDS and uid not in ADMIN_IDS:
+        await update.message.reply_text("Доступ закрыт.")
+        return
+    if PROFILER.running:
+        await update.message.reply_text(
+            f"Профилирование уже идёт: {time.monotonic() - PROFILER.started:.0f} с, "
+            f"сэмплов {sum(PROFILER.stacks.values())}.")
+        return
+    arg = (ctx.args[0] if ctx.args else "30s").lower()
+    try:
+        n = int(arg[:-1] if arg[-1:] in ("s", "u") else arg)
+    except ValueError:
+        n = 0
+    if n <= 0:
+        await update.message.reply_text("Формат: `/profile 30s` или `/profile 200u`", parse_mode="Markdown")
+        return
+    seconds, updates = (None, n) if arg.endswith("u") else (min(n, Sampler.MAX_SECONDS), None)
+    chat_id = update.effective_chat.id
+
+    async def done(sampler):
+        path = os.path.join(PROFILE_DIR, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+        await asyncio.to_thread(sampler.write, path)
+        busy  = sum(sampler.stacks.values())
+        lines = [f"Профиль: {busy} сэмплов, процессор занят {sampler.cpu:.1f} с "
+                 f"из {sampler.wall:.0f} с", f"Файл: {path}", "",
+                 "Собственное время · со вложенными:"]
+        for fn, own, total in sampler.top():
+            lines.append(f"{100 * own / busy:5.1f}% · {100 * total / busy:5.1f}%  {fn}")
+        await ctx.bot.send_message(chat_id, "\n".join(lines) if busy else "Профиль пуст — бот простаивал.")
+
+    PROFILER.start(seconds, updates, done)
+    what = f"{updates} обновлений (не дольше {Sampler.MAX_SECONDS} с)" if updates else f"{seconds} с"
+    await update.message.reply_text(f"Профилирование включено: {what}.")
 
 
 # ── ДЕДЛАЙН (admin) ───────────────────────────────────────────────────────────
 
+class Frozen:
+    """То, что после закрытия голосования уже не меняется: ответ /stats.
+
+    Матрицу бюллетеней замораживает само хранилище (Store.freeze), и
+    остальные хендлеры читают её оттуда; здесь только счётчики, которые
+    /stats больше не нужно пересчитывать.
+    """
+
+    def __init__(self, c):
+        self.completed = c.store.completed_count()
+        self.stats     = _render_stats(c, "голосование закрыто") if self.completed else None
+
+
+def _close_job(c):
+    return f"close_voting:{c.id}"
+
+def schedule_close(c, job_queue):
+    """Ставит закрытие голосования конкурса на текущий дедлайн, снимая прежнее."""
+    if job_queue is None:
+        return
+    for job in job_queue.get_jobs_by_name(_close_job(c)):
+        job.schedule_removal()
+    delay = max(get_deadline(c) - datetime.now(timezone.utc), timedelta(0))
+    job_queue.run_once(close_voting, delay, name=_close_job(c), data=c.id)
+
+async def close_voting(ctx):
+    c = CONTESTS.get(ctx.job.data)
+    if datetime.now(timezone.utc) < get_deadline(c):
+        # Дедлайн передвинули правкой настроек снаружи
+        schedule_close(c, ctx.job_queue)
+        return
+    if c.settings.closed:
+        return
+    c.settings.closed = True
+    await c.store.freeze()
+    c.frozen = Frozen(c)
+    c.responses.bump()
+    logger.info("Голосование %s закрыто: %d участников", c.id, c.frozen.completed)
+
+def reopen_voting(c):
+    c.settings.closed = False
+    c.store.thaw()
+    c.frozen = None
+    c.responses.bump()
+    logger.info("Голосование %s снова открыто до %s", c.id, get_deadline(c).isoformat())
+
+def _deadline_changed(c, job_queue):
+    if c.settings.closed and datetime.now(timezone.utc) < get_deadline(c):
+        reopen_voting(c)
+    schedule_close(c, job_queue)
+
+def _msk(dt):
+    return (dt + timedelta(hours=3)).strftime("%d.%m.%Y %H:%M")
+
 async def set_deadline(update, ctx):
     uid = update.effective_user.id
     if ADMIN_IDS and uid not in ADMIN_IDS:
         await update.message.reply_text("Доступ закрыт.")
         return
-    dl = get_deadline()
+    c  = contest_of(ctx)
+    dl = get_deadline(c)
     if not ctx.args:
-        cfg      = load(CONFIG_FILE)
-        dl_msk   = (dl + timedelta(hours=3)).strftime("%d.%m.%Y %H:%M")
-        source   = "" if "deadline_utc" in cfg else " _(по умолчанию)_"
+        source   = "" if "deadline_utc" in c.settings.cfg else " _(по умолчанию)_"
         await update.message.reply_text(
-            f"Дедлайн: *{dl_msk} МСК*{source}\n\n"
+            f"{c.title} · дедлайн: *{_msk(dl)} МСК*{source}\n\n"
             "Изменить: `/set_deadline 14.03.2026 22:00`\n"
             "Сброс: `/set_deadline off`",
             parse_mode="Markdown")
         return
     if ctx.args[0].lower() == "off":
-        cfg = load(CONFIG_FILE); cfg.pop("deadline_utc", None); save(CONFIG_FILE, cfg)
-        await update.message.reply_text("Дедлайн сброшен к значению по умолчанию: *14.03.2026 19:00 МСК*", parse_mode="Markdown")
+        await c.settings.update(deadline_utc=None)
+        _deadline_changed(c, ctx.job_queue)
+        await update.message.reply_text(
+            f"Дедлайн сброшен к значению по умолчанию: *{_msk(c.settings.default)} МСК*", parse_mode="Markdown")
         return
     try:
         dt_str = f"{ctx.args[0]} {ctx.args[1]}" if len(ctx.args) >= 2 else ctx.args[0]
         naive  = datetime.strptime(dt_str, "%d.%m.%Y %H:%M")
         utc_dt = naive.replace(tzinfo=timezone.utc) - timedelta(hours=3)
-        cfg    = load(CONFIG_FILE); cfg["deadline_utc"] = utc_dt.isoformat(); save(CONFIG_FILE, cfg)
-        await update.message.reply_text(f"Дедлайн: *{naive.strftime('%d.%m.%Y %H:%M')} МСК*", parse_mode="Markdown")
+        await c.settings.update(deadline_utc=utc_dt.isoformat())
+        _deadline_changed(c, ctx.job_queue)
+        await update.message.reply_text(f"{c.title} · дедлайн: *{naive.strftime('%d.%m.%Y %H:%M')} МСК*", parse_mode="Markdown")
     except (ValueError, IndexError):
         await update.message.reply_text("Формат: `/set_deadline 14.03.2026 22:00`", parse_mode="Markdown")
 
 
+async def check_stats(update, ctx):
+    """Сверка счётчиков /stats и рейтинга с полным пересчётом (admin)."""
+    uid = update.effective_user.id
+    if ADMIN_IDS and uid not in ADMIN_IDS:
+        await update.message.reply_text("Доступ закрыт.")
+        return
+    c   = contest_of(ctx)
+    bad = c.store.check()
+    if bad:
+        c.responses.bump()
+    if not bad:
+        await update.message.reply_text("Счётчики /stats и рейтинг сходятся с голосами.")
+        return
+    await update.message.reply_text(
+        "Счётчики разошлись и пересчитаны заново:\n" + "\n".join(bad))
+
+
 # ── ЗАПУСК ────────────────────────────────────────────────────────────────────
 
 
-async def show_results(update, ctx):
-    results = load(RESULTS_FILE)
-    if not results:
-        await update.message.reply_text(
-            "*OSCAR 2026*\n\nПобедители ещё не объявлены.\nПриходите после 15 марта.",
-            parse_mode="Markdown")
-        return
+def _render_results(c):
+    results = c.store.results
     lines = []
-    for cat in CATEGORIES:
+    for cat in c.categories:
         winner = results.get(cat["id"])
         if winner:
             lines.append(f"*{cat['title'].upper()}*\n  ★  `{winner}`")
-    await update.message.reply_text(
-        f"*ПОБЕДИТЕЛИ · OSCAR 2026*\n\n" + f"\n{DIVIDER}\n".join(lines),
-        parse_mode="Markdown")
+    return f"*ПОБЕДИТЕЛИ · {c.title}*\n\n" + f"\n{DIVIDER}\n".join(lines)
 
-
-async def my_results(update, ctx):
-    uid     = str(update.effective_user.id)
-    entry   = load(DATA_FILE).get(uid)
-    results = load(RESULTS_FILE)
-
-    if not entry:
-        await update.message.reply_text("Вы не участвовали в голосовании.")
-        return
-    if not results:
+async def show_results(update, ctx):
+    c = contest_of(ctx)
+    if not c.store.results:
         await update.message.reply_text(
-            "*OSCAR 2026*\n\nПобедители ещё не объявлены.",
+            f"*{c.title}*\n\nПобедители ещё не объявлены.\nПриходите после церемонии — {c.ceremony}.",
             parse_mode="Markdown")
         return
+    await update.message.reply_text(
+        c.responses.get(("results",), lambda: _render_results(c)), parse_mode="Markdown")
+
+
+def _render_my_results(c, uid):
+    """Текст /my_results; None — участник не голосовал или победителей ещё нет."""
+    entry   = c.store.get(uid)
+    results = c.store.results
+    if not entry or not results:
+        return None
 
     preds  = entry.get("predictions", {})
     wishes = entry.get("wishes", {})
     lines  = []
     correct = 0
 
-    for cat in CATEGORIES:
+    for cat in c.categories:
         winner = results.get(cat["id"])
         if not winner:
             continue
         my_pred = preds.get(cat["id"], "—")
         my_wish = wishes.get(cat["id"], "—")
-        hit = my_pred.strip().lower() == winner.strip().lower()
+        hit = _same(my_pred, winner)
         if hit:
             correct += 1
         mark = "✓" if hit else "✗"
@@ -544,11 +2664,60 @@ async def my_results(update, ctx):
 
     total = len(results)
     pct   = round(100 * correct / total) if total else 0
+    return (f"*МОИ РЕЗУЛЬТАТЫ · {c.title}*\n\n" +
+            f"\n{DIVIDER}\n".join(lines) +
+            f"\n\n{DIVIDER}\n\n"
+            f"Угадано: *{correct} / {total}* ({pct}%)" +
+            _standing_line(c, uid))
+
+async def my_results(update, ctx):
+    c   = contest_of(ctx)
+    uid = str(update.effective_user.id)
+    if c.store.get(uid) is None:
+        await update.message.reply_text("Вы не участвовали в голосовании.")
+        return
+    if not c.store.results:
+        await update.message.reply_text(
+            f"*{c.title}*\n\nПобедители ещё не объявлены.",
+            parse_mode="Markdown")
+        return
+    await update.message.reply_text(_render_my_results(c, uid), parse_mode="Markdown")
+
+def _standing_line(c, uid):
+    r  = c.store.ballots.rows.get(uid)
+    st = c.store.board.standing(r) if r is not None else None
+    if not st:
+        return ""
+    place, n, tied = st
+    tie = f", вместе с вами — ещё {tied}" if tied else ""
+    return f"\nМесто в рейтинге: *{place} из {n}*{tie}\n/around — соседи по таблице"
+
+async def around(update, ctx):
+    """Участники чуть выше и чуть ниже в рейтинге — без всей таблицы."""
+    c       = contest_of(ctx)
+    uid     = str(update.effective_user.id)
+    results = c.store.results
+    r       = c.store.ballots.rows.get(uid)
+    if not results:
+        await update.message.reply_text(
+            f"*{c.title}*\n\nПобедители ещё не объявлены.",
+            parse_mode="Markdown")
+        return
+    if r is None or not c.store.board.standing(r):
+        await update.message.reply_text("Вы не участвовали в голосовании.")
+        return
+    board  = c.store.board
+    graded = len(results)
+    lines  = []
+    for row in board.around(r):
+        name, username = c.store.voter(row)
+        tag  = f"@{username}" if username else name
+        me   = "  ← вы" if row == r else ""
+        wish = f"  ·  ✦ {board.wish_ok[row]}/{graded}" if board.wish_ok[row] else ""
+        lines.append(f"`{board.place(row)}.`  {tag} — ★ {board.correct[row]}/{graded}{wish}{me}")
+    place, n, _ = board.standing(r)
     await update.message.reply_text(
-        f"*МОИ РЕЗУЛЬТАТЫ · OSCAR 2026*\n\n" +
-        f"\n{DIVIDER}\n".join(lines) +
-        f"\n\n{DIVIDER}\n\n"
-        f"Угадано: *{correct} / {total}* ({pct}%)",
+        f"*РЯДОМ С ВАМИ*  ·  {place} из {n}\n\n" + "\n".join(lines),
         parse_mode="Markdown")
 
 async def help_command(update, ctx):
@@ -560,57 +2729,490 @@ async def help_command(update, ctx):
         "/stats — Статистика голосования\n"
         "/results — Победители церемонии\n"
         "/my\\_results — Мои результаты vs победители\n"
+        "/around — Соседи по рейтингу\n"
+        "/contests — Другие конкурсы\n"
         "/help — Список команд"
     )
     await update.message.reply_text(text, parse_mode="Markdown")
 
+# ── ВЫГРУЗКА И ЗАГРУЗКА ───────────────────────────────────────────────────────
+#
+# Строка выгрузки — ответ одного участника в одной категории. Строки отдаёт
+# генератор прямо по матрице бюллетеней, поэтому выгрузка миллионов строк
+# не держит в памяти второй копии голосов. Загрузка принимает тот же формат.
+
+EXPORT_FIELDS = ("uid", "name", "username", "completed", "category", "prediction", "wish", "hit")
+
+def export_rows(ballots, results, completed=False, category=None):
+    """Кортежи EXPORT_FIELDS; hit — угадан ли победитель (None, пока он не объявлен)."""
+    cats = [category] if category else ballots.cats
+    for r, uid in enumerate(ballots.uids):
+        if completed and not ballots.done[r]:
+            continue
+        entry  = ballots._decode(uid, r)
+        preds  = entry["predictions"]
+        wishes = entry["wishes"]
+        for cat_id in cats:
+            p, w = preds.get(cat_id), wishes.get(cat_id)
+            if p is None and w is None:
+                continue
+            winner = results.get(cat_id)
+            hit    = None if winner is None or p is None else _same(p, winner)
+            yield (uid, entry.get("name") or "", entry.get("username") or "", entry["completed"],
+                   cat_id, p or "", w or "", hit)
+
+def export_lines(rows, fmt="csv"):
+    """Строки текста для файла выгрузки; у CSV первой идёт шапка."""
+    if fmt == "jsonl":
+        for row in rows:
+            yield json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + "\n"
+        return
+    buf = io.StringIO()
+    out = csv.writer(buf, lineterminator="\n")
+    def line(row):
+        out.writerow(row)
+        text = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return text
+    yield line(EXPORT_FIELDS)
+    for row in rows:
+        yield line(row[:3] + (int(row[3]),) + row[4:7] + ("" if row[7] is None else int(row[7]),))
+
+def read_rows(f, fmt="csv"):
+    """Строки выгрузки словарями — из CSV с шапкой или JSONL."""
+    if fmt == "jsonl":
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(f)
+
+def _flag(v):
+    if v is None or v == "":
+        return None
+    return str(v).strip().lower() in ("1", "true", "yes")
+
+def import_entries(store, rows):
+    """(uid, бюллетень) из строк выгрузки: подряд идущие строки участника — один бюллетень.
+
+    Ответы дописываются к уже сохранённому бюллетеню — в том числе к
+    загруженному несколькими строками раньше, так что строки одного участника
+    не обязаны идти подряд (put_many кладёт каждый бюллетень в память до того,
+    как генератор прочитает следующую группу). Без completed участник
+    считается закончившим, если у него есть прогноз в каждой категории.
+    """
+    cats = {cat["id"] for cat in store.categories}
+    uid = entry = done = None
+    for n, row in enumerate(rows, 1):
+        cat_id = row.get("category")
+        if cat_id not in cats:
+            raise ValueError(f"строка {n}: нет категории {cat_id!r}")
+        raw = str(row.get("uid", "")).strip()
+        # Telegram user id: рассылка и /start работают с ним как с числом
+        if not (raw.isascii() and raw.isdigit()):
+            raise ValueError(f"строка {n}: uid должен быть числом, а не {raw!r}")
+        if str(int(raw)) != uid:
+            if entry:
+                yield uid, _imported(entry, done, len(cats))
+            uid   = str(int(raw))
+            entry = store.get(uid) or {"name": "", "username": "", "predictions": {}, "wishes": {}}
+            entry = {**entry, "predictions": dict(entry.get("predictions", {})),
+                     "wishes": dict(entry.get("wishes", {}))}
+            done  = None
+        for key in ("name", "username"):
+            if row.get(key):
+                entry[key] = row[key]
+        for key, side in (("prediction", "predictions"), ("wish", "wishes")):
+            if row.get(key):
+                entry[side][cat_id] = row[key]
+        if _flag(row.get("completed")) is not None:
+            done = _flag(row.get("completed"))
+    if entry:
+        yield uid, _imported(entry, done, len(cats))
+
+def _imported(entry, done, total):
+    entry["completed"] = len(entry["predictions"]) >= total if done is None else done
+    return entry
+
+async def export(update, ctx):
+    """/export [csv|jsonl] [completed] [категория] — ответы участников файлом (admin)."""
+    uid = update.effective_user.id
+    if ADMIN_IDS and uid not in ADMIN_IDS:
+        await update.message.reply_text("Доступ закрыт.")
+        return
+    c = contest_of(ctx)
+    fmt, completed, category = "csv", False, None
+    for arg in ctx.args:
+        if arg in ("csv", "jsonl"):
+            fmt = arg
+        elif arg == "completed":
+            completed = True
+        elif arg in c.cat_by_id:
+            category = arg
+        else:
+            await update.message.reply_text(
+                f"Не понимаю «{arg}».\n/export [csv|jsonl] [completed] [id категории]")
+            return
+    lines = export_lines(export_rows(c.store.ballots, c.store.results, completed, category), fmt)
+    n = -1 if fmt == "csv" else 0
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.open(tmp, "wt", encoding="utf-8", newline="") as f:
+            # Пачками, отдавая цикл событий между ними: голосование идёт своим чередом
+            for chunk in iter(lambda: list(islice(lines, 5000)), []):
+                f.writelines(chunk)
+                n += len(chunk)
+                await asyncio.sleep(0)
+        tmp.seek(0)
+        name = "-".join([c.id] + ([category] if category else []) + (["completed"] if completed else []))
+        await update.message.reply_document(tmp, filename=f"{name}.{fmt}.gz",
+                                            caption=f"{c.title}: строк {max(n, 0)}")
+
+
+# ── РАССЫЛКА ИТОГОВ ───────────────────────────────────────────────────────────
+
+class RateLimiter:
+    """Не чаще rate событий в секунду на всех, кто делит этот объект."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next     = 0.0
+
+    async def wait(self):
+        # Очередь мест занимается синхронно, так что гонки между задачами нет
+        now  = time.monotonic()
+        slot = max(now, self.next)
+        self.next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+BROADCAST_LIMIT = RateLimiter(BROADCAST_RATE)
+
+
+class Broadcast:
+    """Рассылка каждому, кто закончил голосование, его /my_results.
+
+    Идёт фоновой задачей по участникам в порядке возрастания uid; скорость
+    общая для всех рассылок процесса (BROADCAST_LIMIT). Каждому чату — одно
+    сообщение, так что лимит на чат не задевается. Позиция — последний
+    отправленный uid — хранится в настройках конкурса (ключ broadcast):
+    порядок не зависит от того, в каком порядке бюллетени легли в память
+    процесса, и после рестарта рассылку продолжает любой процесс. Прогресс —
+    в одном сообщении у админа, которое правится по ходу.
+    """
+
+    SAVE_EVERY     = 50       # сообщений между сохранениями позиции
+    REPORT_EVERY   = 5.0      # сек. между правками сообщения с прогрессом
+    RETRIES        = 3
+
+    def __init__(self, contest):
+        self.contest = contest
+        self.state   = None
+        self._task   = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def start(self, bot, chat_id):
+        msg = await bot.send_message(chat_id, "Рассылка результатов: начинаем…")
+        self.state = {"after": 0, "sent": 0, "failed": 0, "done": False,
+                      "chat": chat_id, "message": msg.message_id}
+        await self.contest.settings.update(broadcast=self.state)
+        self._task = asyncio.create_task(self._run(bot))
+
+    def resume(self, bot):
+        """Продолжает рассылку, прерванную рестартом."""
+        settings = self.contest.settings
+        settings.refresh()
+        st = settings.cfg.get("broadcast")
+        if st and not st.get("done"):
+            self.state = dict(st)
+            self._task = asyncio.create_task(self._run(bot))
+            logger.info("Рассылка %s продолжается после uid %d", self.contest.id, st["after"])
+
+    async def stop(self):
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def _pending(self, after):
+        """uid закончивших голосование, больше after, по возрастанию."""
+        b = self.contest.store.ballots
+        return sorted(uid for uid in (int(b.uids[r]) for r in range(len(b)) if b.done[r]) if uid > after)
+
+    async def _run(self, bot):
+        st, unsaved, reported = self.state, 0, time.monotonic()
+        settings = self.contest.settings
+        try:
+            # Бюллетени с uid больше отправленного, появившиеся за проход, — следующим проходом.
+            # Меньшие пропускаются, но к рассылке итогов голосование уже закрыто
+            while todo := self._pending(st["after"]):
+                for uid in todo:
+                    ok = await self._send(bot, str(uid))
+                    st["after"] = uid
+                    st["sent" if ok else "failed"] += 1
+                    unsaved += 1
+                    if unsaved >= self.SAVE_EVERY:
+                        unsaved = 0
+                        await settings.update(broadcast=dict(st))
+                    if time.monotonic() - reported >= self.REPORT_EVERY:
+                        reported = time.monotonic()
+                        await self._report(bot)
+            st["done"] = True
+            await self._report(bot)
+        finally:
+            await settings.update(broadcast=dict(st))
+
+    async def _send(self, bot, uid):
+        text = _render_my_results(self.contest, uid)
+        if text is None:
+            return False
+        for attempt in range(self.RETRIES + 1):
+            await BROADCAST_LIMIT.wait()
+            try:
+                await bot.send_message(int(uid), text, parse_mode="Markdown")
+                return True
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except (Forbidden, BadRequest) as e:
+                # Бот заблокирован, чат удалён — повтор не поможет
+                logger.info("Рассылка: %s пропущен (%s)", uid, e)
+                return False
+            except NetworkError:
+                await asyncio.sleep(2 ** attempt)
+        logger.warning("Рассылка: %s не доставлено после %d попыток", uid, self.RETRIES + 1)
+        return False
+
+    def progress(self):
+        st = self.state
+        head = "Рассылка результатов завершена" if st["done"] else "Рассылка результатов"
+        return (f"{head}: {st['sent'] + st['failed']} из {self.contest.store.completed_count()}\n"
+                f"Доставлено: {st['sent']}, не доставлено: {st['failed']}")
+
+    async def _report(self, bot):
+        try:
+            await bot.edit_message_text(self.progress(), chat_id=self.state["chat"],
+                                        message_id=self.state["message"])
+        except TelegramError as e:
+            logger.info("Прогресс рассылки не обновлён: %s", e)
+
+
+async def broadcast(update, ctx):
+    """Разослать всем участникам их результаты (admin)."""
+    uid = update.effective_user.id
+    if ADMIN_IDS and uid not in ADMIN_IDS:
+        await update.message.reply_text("Доступ закрыт.")
+        return
+    c = contest_of(ctx)
+    if c.broadcast.running:
+        await update.message.reply_text(c.broadcast.progress())
+        return
+    if not c.store.results:
+        await update.message.reply_text("Победители ещё не введены — /admin")
+        return
+    await c.broadcast.start(ctx.bot, update.effective_chat.id)
+
 async def post_init(app):
+    """Запускаем хранилища, метрики и задачи конкурсов."""
+    if app.persistence:
+        app.persistence.writer.start()
+    start_metrics_server()
+    if app.job_queue is None:
+        logger.warning("Нет python-telegram-bot[job-queue]: голосование закрывается только по часам")
+    CONTESTS.start(app)
+    if WORKERS == 1:
+        await set_commands(app.bot)
+
+async def set_commands(bot):
     """Регистрируем команды — они появятся в меню '/'."""
-    await app.bot.set_my_commands([
+    await bot.set_my_commands([
         BotCommand("start",       "Участвовать в голосовании"),
         BotCommand("my_votes",    "Мои прогнозы"),
         BotCommand("leaderboard", "Таблица лидеров"),
         BotCommand("stats",       "Статистика голосования"),
         BotCommand("my_results",  "Мои результаты vs победители"),
         BotCommand("results",     "Победители церемонии"),
+        BotCommand("around",      "Соседи по рейтингу"),
+        BotCommand("contests",    "Другие конкурсы"),
         BotCommand("help",        "Список команд"),
     ])
 
-def main():
-    token = os.environ.get("BOT_TOKEN")
-    if not token:
-        raise RuntimeError("Нет BOT_TOKEN!")
-
-    app = Application.builder().token(token).post_init(post_init).build()
+async def post_shutdown(app):
+    """Останавливаем рассылки и дожидаемся, пока Writer'ы допишут очереди на диск."""
+    await CONTESTS.stop()
+
+class FloodGuard:
+    """Token bucket на пользователя и отсев повторных нажатий одной кнопки.
+
+    Корзина вмещает FLOOD_BURST обновлений и пополняется на FLOOD_RATE в секунду.
+    Пользователи, которые давно молчат (корзина уже полна), забываются —
+    память зависит только от числа активных за последние секунды.
+    """
+
+    def __init__(self, rate, burst, debounce, notice):
+        self.rate     = rate
+        self.burst    = burst
+        self.debounce = debounce
+        self.notice   = notice
+        self.idle     = max(burst / rate if rate else 0, debounce)
+        # id -> [токены, когда пополнены, последняя кнопка, когда нажата, когда ответили на отброшенное]
+        self.users    = OrderedDict()
+
+    def allow(self, key, now):
+        """Забирает токен; False — обновление отбросить."""
+        u = self.users.get(key)
+        if u is None:
+            u = self.users[key] = [self.burst, now, None, 0.0, float("-inf")]
+        else:
+            self.users.move_to_end(key)
+            u[0] = min(self.burst, u[0] + (now - u[1]) * self.rate)
+            u[1] = now
+        while True:
+            old = next(iter(self.users.values()))
+            if now - old[1] <= self.idle:
+                break
+            self.users.popitem(last=False)
+        if not self.rate or key in ADMIN_IDS:
+            return True
+        if u[0] < 1:
+            return False
+        u[0] -= 1
+        return True
+
+    def duplicate(self, key, query, now):
+        """Та же кнопка того же сообщения, что и только что обработанная."""
+        u = self.users.get(key)
+        if u is None or not self.debounce:
+            return False
+        tap = (query.message.message_id if query.message else query.inline_message_id, query.data)
+        if u[2] == tap and now - u[3] < self.debounce:
+            return True
+        u[2], u[3] = tap, now
+        return False
+
+    def notify(self, key, now):
+        """Ответить ли на отброшенное нажатие — не чаще раза в notice сек."""
+        u = self.users.get(key)
+        if u is None or now - u[4] < self.notice:
+            return False
+        u[4] = now
+        return True
+
+
+FLOOD = FloodGuard(FLOOD_RATE, FLOOD_BURST, CALLBACK_DEBOUNCE, FLOOD_NOTICE)
+
+
+class PerUserProcessor(BaseUpdateProcessor):
+    """Разные пользователи обрабатываются параллельно, один пользователь — по очереди.
+
+    ConversationHandler (PREDICT/WISH) и ctx.user_data["idx"] рассчитаны на то,
+    что нажатия одного человека приходят в хендлеры в порядке отправки.
+    Слот CONCURRENT_UPDATES берётся уже в очереди пользователя: пока
+    обрабатывается одно его обновление, остальные ждут, не занимая слотов.
+    Флуд отсекается здесь же, до очереди пользователя: лишние обновления
+    не занимают слоты, а запросов к Bot API на них уходит не больше одной
+    подсказки в FLOOD_NOTICE сек.
+
+    process_update в PTB помечен @final и берёт свой семафор до
+    do_process_update — то есть до очереди пользователя. Поэтому он
+    переопределён намеренно, а слоты считает свой семафор (_slots; семафор
+    базового класса не используется). Проверено на python-telegram-bot 21.9,
+    версия закреплена в requirements.txt; при обновлении PTB сверить, что
+    Application по-прежнему зовёт только process_update.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}          # user/chat id -> [Lock, сколько задач его ждут]
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+
+    async def process_update(self, update, coroutine):
+        # Переопределяем @final-метод намеренно (см. docstring): нужен порядок «пользователь, потом слот»
+        key = None
+        if isinstance(update, Update):
+            who = update.effective_user or update.effective_chat
+            key = who.id if who else None
+        if key is None:
+            try:
+                async with self._slots:
+                    await coroutine
+            finally:
+                PROFILER.tick()
+            return
+        query = update.callback_query
+        now   = time.monotonic()
+        if not FLOOD.allow(key, now):
+            coroutine.close()
+            METRICS.inc("oscar_updates_throttled_total", kind="callback" if query else "message")
+            if query and FLOOD.notify(key, now):
+                await query.answer("Слишком часто — подождите секунду")
+            return
+        slot = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                # Повтор сверяем в очереди пользователя — после того, как первое нажатие обработано
+                if query and FLOOD.duplicate(key, query, time.monotonic()):
+                    coroutine.close()
+                    METRICS.inc("oscar_callbacks_debounced_total")
+                    await query.answer()
+                    return
+                async with self._slots:
+                    await self.do_process_update(update, coroutine)
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._locks[key]
+            PROFILER.tick()
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+def build_app(token):
+    """Приложение со всеми хендлерами — одно и то же для polling и webhook."""
+    builder = (Application.builder().token(token).base_url(BOT_API_URL)
+               .concurrent_updates(PerUserProcessor(CONCURRENT_UPDATES))
+               .request(TimedRequest(connection_pool_size=CONNECTION_POOL_SIZE))
+               .post_init(post_init).post_shutdown(post_shutdown))
+    if SESSIONS:
+        builder.persistence(SESSIONS)
+    app = builder.build()
 
     user_conv = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
+        # revote/showvotes — кнопки под ответом /start, когда разговор уже завершён:
+        # состояния END у ConversationHandler нет, поэтому это точки входа
+        entry_points=[
+            CommandHandler("start", start),
+            CallbackRouter({"r": handle_revote, "s": handle_showvotes}),
+        ],
         states={
-            PREDICT: [
-                CallbackQueryHandler(handle_predict, pattern=r"^predict_\d+_\d+$"),
-                CallbackQueryHandler(handle_back,    pattern=r"^back_predict_\d+$"),
-                CallbackQueryHandler(handle_revote,    pattern=r"^revote$"),
-                CallbackQueryHandler(handle_showvotes, pattern=r"^showvotes$"),
-            ],
-            WISH: [
-                CallbackQueryHandler(handle_wish, pattern=r"^wish_\d+_\d+$"),
-                CallbackQueryHandler(handle_back, pattern=r"^back_wish_\d+$"),
-            ],
-            ConversationHandler.END: [
-                CallbackQueryHandler(handle_revote,    pattern=r"^revote$"),
-                CallbackQueryHandler(handle_showvotes, pattern=r"^showvotes$"),
-            ],
+            PREDICT: [CallbackRouter({"p": handle_predict, "b": handle_back,
+                                      "r": handle_revote,  "s": handle_showvotes})],
+            WISH:    [CallbackRouter({"w": handle_wish, "b": handle_back})],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
         per_message=False,
         allow_reentry=True,
+        name="vote",
+        persistent=SESSIONS is not None,
     )
 
     admin_conv = ConversationHandler(
         entry_points=[CommandHandler("admin", admin)],
         states={
-            ADMIN_CAT: [CallbackQueryHandler(admin_pick_cat,    pattern=r"^(acat_|adone)")],
-            ADMIN_WIN: [CallbackQueryHandler(admin_pick_winner, pattern=r"^(awin_|aback)")],
+            ADMIN_CAT: [CallbackRouter({"c": admin_pick_cat, "d": admin_done})],
+            ADMIN_WIN: [CallbackRouter({"a": admin_pick_winner, "x": admin_back})],
         },
         fallbacks=[CommandHandler("admin_cancel", admin_cancel)],
         per_message=False,
@@ -622,12 +3224,208 @@ def main():
     app.add_handler(CommandHandler("leaderboard",  leaderboard))
     app.add_handler(CommandHandler("stats",        stats))
     app.add_handler(CommandHandler("set_deadline", set_deadline))
+    app.add_handler(CommandHandler("check_stats",  check_stats))
+    app.add_handler(CommandHandler("cache",        cache_stats))
+    app.add_handler(CommandHandler("storage",      storage_stats))
+    app.add_handler(CommandHandler("broadcast",    broadcast))
     app.add_handler(CommandHandler("results",      show_results))
     app.add_handler(CommandHandler("my_results",   my_results))
+    app.add_handler(CommandHandler("around",       around))
+    app.add_handler(CommandHandler("contests",     contests))
+    app.add_handler(CommandHandler("metrics",      metrics))
+    app.add_handler(CommandHandler("profile",      profile))
+    app.add_handler(CommandHandler("export",       export))
     app.add_handler(CommandHandler("help",         help_command))
+    # Последним: кнопки, которые не подошли ни одному состоянию разговора
+    app.add_handler(CallbackQueryHandler(stale_button))
+    instrument(app)
+    return app
+
+def instrument(app):
+    """Оборачивает колбэки всех зарегистрированных хендлеров, включая вложенные в разговоры."""
+    def walk(handlers):
+        for h in handlers:
+            if isinstance(h, ConversationHandler):
+                walk(h.entry_points)
+                for hs in h.states.values():
+                    walk(hs)
+                walk(h.fallbacks)
+            elif isinstance(h, CallbackRouter):
+                h.routes = {op: instrumented(fn.__name__, fn) for op, fn in h.routes.items()}
+            else:
+                h.callback = instrumented(h.callback.__name__, h.callback)
+    for group in app.handlers.values():
+        walk(group)
+
+# ── НЕСКОЛЬКО ПРОЦЕССОВ ───────────────────────────────────────────────────────
+#
+# При WORKERS > 1 главный процесс только принимает обновления (polling или
+# webhook) и раскладывает их по очередям обработчиков: user id % WORKERS.
+# Все обновления одного человека попадают в один процесс — разговор и
+# user_data живут там же. Голоса пишутся в общую базу SQLite, чужие изменения
+# каждый процесс подтягивает из таблицы changes (Contest.sync).
+
+def _partition(update):
+    who = update.effective_user or update.effective_chat
+    return who.id % WORKERS if who else 0
+
+def build_front(token):
+    """Приложение-распределитель: сам ничего не обрабатывает, запускает WORKERS обработчиков."""
+    queues  = [multiprocessing.Queue() for _ in range(WORKERS)]
+    workers = [multiprocessing.Process(target=run_worker, args=(token, i, q), name=f"worker-{i}")
+               for i, q in enumerate(queues)]
+    for w in workers:
+        w.start()
+
+    async def forward(update, ctx):
+        queues[_partition(update)].put(update.to_dict())
+
+    async def front_init(app):
+        await set_commands(app.bot)
+
+    async def front_shutdown(app):
+        # Пустое обновление — сигнал обработчику доделать очередь и выйти
+        for q in queues:
+            q.put(None)
+        for w in workers:
+            await asyncio.to_thread(w.join)
+
+    app = (Application.builder().token(token).base_url(BOT_API_URL)
+           .request(TimedRequest(connection_pool_size=CONNECTION_POOL_SIZE))
+           .post_init(front_init).post_shutdown(front_shutdown).build())
+    app.add_handler(TypeHandler(Update, forward))
+    return app
+
+def run_worker(token, index, queue):
+    """Процесс-обработчик: свои пользователи, общие базы конкурсов."""
+    global WORKER_INDEX
+    WORKER_INDEX = index
+    # Останавливает обработчик распределитель, а не сигнал в группу процессов
+    signal.signal(signal.SIGINT,  signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_serve_worker(token, queue))
+
+async def _serve_worker(token, queue):
+    CONTESTS.default
+    if SESSIONS:
+        SESSIONS.open()
+    app = build_app(token)
+    await app.initialize()
+    await post_init(app)
+    await app.start()
+    logger.info("Обработчик %d/%d запущен", WORKER_INDEX + 1, WORKERS)
+    while (data := await asyncio.to_thread(_receive, queue)) is not None:
+        await app.update_queue.put(Update.de_json(data, app.bot))
+    await app.stop()
+    await app.shutdown()
+    await post_shutdown(app)
+    logger.info("Обработчик %d/%d остановлен", WORKER_INDEX + 1, WORKERS)
+
+def _receive(queue):
+    """Следующее обновление из очереди; None — распределитель велел остановиться или умер."""
+    front = multiprocessing.parent_process()
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            # Упавший распределитель пустое обновление уже не пришлёт
+            if front is not None and not front.is_alive():
+                logger.warning("Обработчик %d/%d: распределитель завершился, останавливаемся",
+                               WORKER_INDEX + 1, WORKERS)
+                return None
+
+def main():
+    token = os.environ.get("BOT_TOKEN")
+    if not token:
+        raise RuntimeError("Нет BOT_TOKEN!")
 
-    logger.info("Oscar Bot · запущен")
-    app.run_polling(drop_pending_updates=True)
+    if WORKERS > 1:
+        if STORAGE != "sqlite":
+            raise RuntimeError("WORKERS > 1 работает только с STORAGE=sqlite")
+        app = build_front(token)
+    else:
+        CONTESTS.default          # остальные конкурсы загрузятся при первом обращении
+        if SESSIONS:
+            SESSIONS.open()
+        app = build_app(token)
+    if WEBHOOK_URL:
+        # Накопившиеся за время рестарта обновления Telegram дошлёт на webhook
+        logger.info("Oscar Bot · запущен (webhook на %s:%d/%s)", WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH)
+        app.run_webhook(listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, url_path=WEBHOOK_PATH,
+                        webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+                        secret_token=WEBHOOK_SECRET, allowed_updates=Update.ALL_TYPES,
+                        drop_pending_updates=False)
+    else:
+        logger.info("Oscar Bot · запущен")
+        app.run_polling(drop_pending_updates=True)
+
+def migrate(cid=DEFAULT_CONTEST):
+    """python bot.py migrate [конкурс] — переносит JSON-файлы (и журнал, если он есть) в базу конкурса."""
+    categories = load(CONTESTS.path(cid))["categories"]
+    journal    = shard(JOURNAL_FILE, cid)
+    src = make_store(cid, categories, "journal" if os.path.exists(journal) else "json")
+    src.open()
+    dst = make_store(cid, categories, "sqlite")
+    dst.open()
+    dst.put_many(src.entries())
+    cfg = src.get_config()
+    dst.commit([("result", cat_id, winner) for cat_id, winner in src.results.items()]
+               + ([("config", cfg)] if cfg else []))
+    src.close()
+    dst.close()
+    logger.info("Перенесено в %s: голосов %d, результатов %d, настроек %d",
+                dst.path, len(src.ballots), len(src.results), len(cfg))
+
+def _open_store(cid):
+    store = make_store(cid, load(CONTESTS.path(cid))["categories"])
+    store.open()
+    return store
+
+def export_file(argv):
+    """python bot.py export [--format jsonl] [--completed] [--category id] [--out файл]"""
+    ap = argparse.ArgumentParser(prog="bot.py export",
+                                 description="Ответы участников: строка на участника и категорию.")
+    ap.add_argument("--contest",   default=DEFAULT_CONTEST)
+    ap.add_argument("--format",    choices=("csv", "jsonl"), default="csv")
+    ap.add_argument("--completed", action="store_true", help="только закончившие голосование")
+    ap.add_argument("--category",  help="id одной категории")
+    ap.add_argument("--out",       help="файл (по умолчанию stdout)")
+    args  = ap.parse_args(argv)
+    store = _open_store(args.contest)
+    if args.category and args.category not in store.ballots.col:
+        ap.error(f"нет категории {args.category}")
+    out = open(args.out, "w", encoding="utf-8", newline="") if args.out else sys.stdout
+    try:
+        out.writelines(export_lines(
+            export_rows(store.ballots, store.results, args.completed, args.category), args.format))
+    finally:
+        if args.out:
+            out.close()
+        store.close()
+
+def import_file(argv):
+    """python bot.py import файл — дописывает бюллетени из выгрузки; бот при этом остановлен."""
+    ap = argparse.ArgumentParser(prog="bot.py import",
+                                 description="Загрузка бюллетеней в формате bot.py export.")
+    ap.add_argument("file", help="CSV или JSONL; - — stdin")
+    ap.add_argument("--contest", default=DEFAULT_CONTEST)
+    ap.add_argument("--format",  choices=("csv", "jsonl"), help="по умолчанию — по расширению файла")
+    args  = ap.parse_args(argv)
+    fmt   = args.format or ("jsonl" if args.file.endswith(".jsonl") else "csv")
+    store = _open_store(args.contest)
+    try:
+        with (sys.stdin if args.file == "-" else open(args.file, encoding="utf-8", newline="")) as f:
+            n = store.put_many(import_entries(store, read_rows(f, fmt)))
+    finally:
+        store.close()
+    logger.info("Загружено в %s: бюллетеней %d, всего голосов %d", store.path, n, len(store.ballots))
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["migrate"]:
+        migrate(*sys.argv[2:3])
+    elif sys.argv[1:2] == ["export"]:
+        export_file(sys.argv[2:])
+    elif sys.argv[1:2] == ["import"]:
+        import_file(sys.argv[2:])
+    else:
+        main()
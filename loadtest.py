@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест bot.py: N одновременных участников проходят весь опрос.
+
+    python loadtest.py --users 2000 --rtt 30 --storage sqlite
+
+Каждый участник — /start, 8 × (predict_ + wish_), иногда ← Назад и повторное
+голосование, затем /stats, /leaderboard и /my_votes. Обновления идут через тот
+же PerUserProcessor и хендлеры, что и в боте; ответы бота принимает локальная
+заглушка Bot API (отдельный процесс) с задержкой --rtt мс. Участник шлёт следующее обновление,
+только когда обработано предыдущее, — как человек, который ждёт ответа.
+
+В конце хранилище открывается заново с диска и каждый бюллетень сверяется
+с тем, что участник отправил.
+
+    python loadtest.py --users 2000 --workers 4
+
+--workers N — как бот с WORKERS=N: обновления принимает распределитель
+bot.build_front и раскладывает по N процессам-обработчикам с общей базой
+SQLite (uid % N) — через те же очереди, что и в боте. Задержки в этом режиме
+меряются до передачи обновления в очередь обработчика. Дополнительно
+проверяется, что после синхронизации каждый процесс видит бюллетени всех
+остальных.
+
+    python loadtest.py --users 1000 --abusers 20
+
+--abusers N — ещё N скриптов всё время прогона шлют /stats и жмут одну и ту же
+кнопку, не дожидаясь ответов. Их обновления идут под меткой abuse; задержки
+честных участников и отброшенное защитой от флуда печатаются как обычно.
+Без --abusers ограничение частоты в боте выключено (FLOOD_RATE=0); с ним
+честные участники, как люди, нажимают не чаще FLOOD_RATE раз в секунду.
+
+    python loadtest.py --users 500 --webhook
+
+--webhook — обновления идут не напрямую в приложение, а POST-запросами на
+встроенный webhook-сервер бота (Updater.start_webhook на локальном порту,
+путь WEBHOOK_PATH, секрет WEBHOOK_SECRET) — так, как их шлёт Telegram.
+Участник ждёт, пока его обновление дойдёт до хендлеров. Дополнительно
+проверяется, что запрос с чужим секретом и без секрета получает 403 и до
+хендлеров не доходит, а на каждую команду и кнопку бот ответил в Bot API.
+"""
+
+import argparse, asyncio, functools, itertools, json, logging, multiprocessing, os, random, shutil, socket, sys, tempfile, time
+import urllib.request
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import tornado.httpserver, tornado.netutil, tornado.web
+from telegram import Update
+from telegram.ext import TypeHandler
+
+TOKEN  = "1:loadtest"
+NOW    = int(time.time())
+SECRET = "X-Telegram-Bot-Api-Secret-Token"
+
+
+# ── ЗАГЛУШКА BOT API ──────────────────────────────────────────────────────────
+
+class StubHandler(tornado.web.RequestHandler):
+    """Отвечает на любой метод Bot API правдоподобным результатом."""
+
+    def initialize(self, stub):
+        self.stub = stub
+
+    async def post(self, token, method):
+        self.stub.calls[method] += 1
+        if self.stub.rtt:
+            await asyncio.sleep(self.stub.rtt)
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Oscar", "username": "oscar_bot"}
+        elif method in ("sendMessage", "editMessageText"):
+            # Bot API принимает параметры формой: строки как есть, остальное — JSON
+            chat_id = int(self.get_body_argument("chat_id", "0"))
+            result  = {"message_id": next(self.stub.ids), "date": NOW,
+                       "chat": {"id": chat_id, "type": "private"},
+                       "text": self.get_body_argument("text", "")}
+        else:
+            result = True
+        self.write({"ok": True, "result": result})
+
+
+class CallsHandler(tornado.web.RequestHandler):
+    def initialize(self, stub):
+        self.stub = stub
+
+    def get(self):
+        self.write(dict(self.stub.calls))
+
+
+class Stub:
+    def __init__(self, rtt):
+        self.rtt   = rtt
+        self.calls = Counter()
+        self.ids   = itertools.count(1)
+
+    def start(self):
+        app = tornado.web.Application([(r"/bot([^/]+)/(\w+)", StubHandler, {"stub": self}),
+                                       (r"/calls", CallsHandler, {"stub": self})])
+        sockets = tornado.netutil.bind_sockets(0, "127.0.0.1")
+        server  = tornado.httpserver.HTTPServer(app)
+        server.add_sockets(sockets)
+        return f"http://127.0.0.1:{sockets[0].getsockname()[1]}"
+
+
+def serve_stub(rtt, pipe):
+    # Заглушка в своём процессе, чтобы не делить с ботом процессор
+    async def main():
+        pipe.send(Stub(rtt).start())
+        await asyncio.Event().wait()
+    asyncio.run(main())
+
+def start_stub(rtt):
+    """(процесс, адрес) запущенной заглушки."""
+    ours, theirs = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=serve_stub, args=(rtt, theirs), daemon=True)
+    proc.start()
+    return proc, ours.recv()
+
+def stub_calls(url):
+    with urllib.request.urlopen(url + "/calls") as f:
+        return json.load(f)
+
+
+# ── ОБНОВЛЕНИЯ ────────────────────────────────────────────────────────────────
+
+UPDATE_IDS = itertools.count(1)
+
+def _user(uid):
+    return {"id": uid, "is_bot": False, "first_name": f"User {uid}", "username": f"user{uid}"}
+
+def _chat(uid):
+    return {"id": uid, "type": "private"}
+
+def command(uid, text):
+    n = next(UPDATE_IDS)
+    return {"update_id": n, "message": {
+        "message_id": n, "date": NOW, "chat": _chat(uid), "from": _user(uid), "text": text,
+        "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]}}
+
+def callback(uid, data):
+    n = next(UPDATE_IDS)
+    return {"update_id": n, "callback_query": {
+        "id": str(n), "chat_instance": str(uid), "from": _user(uid), "data": data,
+        "message": {"message_id": 1, "date": NOW, "chat": _chat(uid), "text": "·"}}}
+
+
+class Run:
+    """Прогон: приложение, замеры по хендлерам и то, что должно оказаться на диске."""
+
+    def __init__(self, bot, app, args):
+        self.bot     = bot
+        self.app     = app
+        self.args    = args
+        self.latency = defaultdict(list)
+        self.errors  = Counter()
+        self.expect  = {}
+        self.http    = None     # клиент webhook при --webhook
+        self.url     = None
+        self.pending = {}       # update_id -> Future, которую закроет processed
+        self.handled = set()    # update_id, дошедшие до хендлеров через webhook
+        self.pace    = 1 / bot.FLOOD_RATE if bot.FLOOD_RATE else 0
+
+    async def start_webhook(self):
+        """Webhook-сервер бота на свободном локальном порту; обновления дальше идут через него."""
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        # Группа после всех хендлеров бота: обновление обработано целиком
+        self.app.add_handler(TypeHandler(Update, self.processed), group=1)
+        await self.app.updater.start_webhook(listen="127.0.0.1", port=port, url_path=self.bot.WEBHOOK_PATH,
+                                             secret_token=self.bot.WEBHOOK_SECRET,
+                                             allowed_updates=Update.ALL_TYPES)
+        self.url  = f"http://127.0.0.1:{port}/{self.bot.WEBHOOK_PATH}"
+        self.http = httpx.AsyncClient(limits=httpx.Limits(max_connections=256), timeout=60)
+
+    async def stop_webhook(self):
+        await self.http.aclose()
+        await self.app.updater.stop()
+
+    async def processed(self, update, ctx):
+        self.handled.add(update.update_id)
+        fut = self.pending.pop(update.update_id, None)
+        if fut is not None:
+            fut.set_result(None)
+
+    async def post(self, data, secret, wait=True):
+        """Статус ответа webhook; wait — ещё и дождаться, пока обновление обработают."""
+        if wait:
+            fut = self.pending[data["update_id"]] = asyncio.get_running_loop().create_future()
+        r = await self.http.post(self.url, json=data, headers={SECRET: secret} if secret else {})
+        if r.status_code != 200:
+            self.pending.pop(data["update_id"], None)
+        elif wait:
+            try:
+                await asyncio.wait_for(fut, 60)
+            except asyncio.TimeoutError:
+                self.errors["не обработано"] += 1
+        return r.status_code
+
+    async def check_secret(self):
+        """Обновление с чужим секретом и без секрета: статусы ответов и id, который не должен дойти до хендлеров."""
+        data = command(3_000_000, "/start")
+        return {"codes": [await self.post(data, secret, wait=False) for secret in ("wrong", None)],
+                "update_id": data["update_id"]}
+
+    async def feed(self, data, label, wait=True):
+        if wait and self.pace:
+            await asyncio.sleep(self.pace)
+        t0 = time.perf_counter()
+        if self.http:
+            if await self.post(data, self.bot.WEBHOOK_SECRET, wait) != 200:
+                self.errors["webhook"] += 1
+        else:
+            upd = Update.de_json(data, self.app.bot)
+            await self.app.update_processor.process_update(upd, self.app.process_update(upd))
+        self.latency[label].append(time.perf_counter() - t0)
+
+    async def on_error(self, update, ctx):
+        self.errors[type(ctx.error).__name__] += 1
+
+    async def participant(self, uid, rng):
+        c    = self.bot.CONTESTS.default
+        cats = c.categories
+        cb   = functools.partial(self.bot.cb, c)
+        await self.feed(command(uid, "/start"), "/start")
+        for rnd in range(2 if rng.random() < self.args.revote else 1):
+            if rnd:
+                await self.feed(callback(uid, cb("r")), "revote")
+            preds  = [rng.randrange(len(c["options"])) for c in cats]
+            wishes = [rng.randrange(len(c["options"])) for c in cats]
+            i, backed = 0, set()
+            while i < len(cats):
+                if i and i not in backed and rng.random() < self.args.back:
+                    backed.add(i)
+                    await self.feed(callback(uid, cb("b", i)), "back")
+                    i -= 1
+                    continue
+                await self.feed(callback(uid, cb("p", i, preds[i])), "predict")
+                last = i == len(cats) - 1
+                await self.feed(callback(uid, cb("w", i, wishes[i])), "finish" if last else "wish")
+                i += 1
+            self.expect[str(uid)] = (
+                {c["id"]: c["options"][k] for c, k in zip(cats, preds)},
+                {c["id"]: c["options"][k] for c, k in zip(cats, wishes)})
+        for cmd in ("/stats", "/leaderboard", "/my_votes"):
+            await self.feed(command(uid, cmd), cmd)
+
+    async def abuser(self, uid, done):
+        """Скрипт: пачки /stats и нажатий одной кнопки, не дожидаясь ответов."""
+        data = self.bot.cb(self.bot.CONTESTS.default, "p", 0, 0)
+        while not done.is_set():
+            # Через webhook обработки не ждём: её может отбросить защита от флуда
+            await asyncio.gather(*(self.feed(callback(uid, data) if k % 2 else command(uid, "/stats"), "abuse",
+                                             wait=False)
+                                   for k in range(20)))
+            await asyncio.sleep(0.05)
+
+    def verify(self):
+        """(потеряно, испорчено, лишних) — по хранилищу, заново прочитанному с диска."""
+        c     = self.bot.CONTESTS.default
+        store = self.bot.make_store(c.id, c.categories)
+        store.open()
+        lost = bad = 0
+        for uid, (preds, wishes) in self.expect.items():
+            entry = store.get(uid)
+            if entry is None:
+                lost += 1
+            elif (entry.get("predictions") != preds or entry.get("wishes") != wishes
+                  or not entry.get("completed")):
+                bad += 1
+        extra = len(store.ballots) - len(self.expect)
+        mismatch = store.check()
+        store.close()
+        return lost, bad, extra, mismatch
+
+
+def pct(xs, q):
+    return xs[min(len(xs) - 1, int(q * len(xs)))] * 1000
+
+def configure(args, workdir, url):
+    os.environ.update({
+        "BOT_API_URL":  url + "/bot",
+        "STORAGE":      args.storage,
+        "WORKERS":      str(args.workers),
+        "FLOOD_RATE":   os.environ.get("FLOOD_RATE", "3") if args.abusers else "0",
+        "DATA_FILE":    os.path.join(workdir, "votes.json"),
+        "RESULTS_FILE": os.path.join(workdir, "results.json"),
+        "CONFIG_FILE":  os.path.join(workdir, "config.json"),
+        "JOURNAL_FILE": os.path.join(workdir, "votes.jsonl"),
+        "DB_FILE":      os.path.join(workdir, "oscar.db"),
+        "SESSION_FILE": os.path.join(workdir, "sessions.db"),
+    })
+    # bot читает настройки из окружения при импорте
+    import bot
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    return bot
+
+def participants(args):
+    rng = random.Random(args.seed)
+    for i in range(args.users):
+        yield 1_000_000 + i, random.Random(rng.random())
+
+def worker_stats(bot):
+    """Сводка процесса, который обрабатывает обновления: запись и флуд."""
+    return {"writer": bot.CONTESTS.default.store.writer.stats(),
+            "flood":  {"throttled": sum(bot.METRICS.counter("oscar_updates_throttled_total", kind=k)
+                                        for k in ("message", "callback")),
+                       "debounced": bot.METRICS.counter("oscar_callbacks_debounced_total")}}
+
+def serve_worker(run_worker, barrier, out, token, index, queue):
+    """Настоящий bot.run_worker; перед остановкой — сверка синхронизации и сводка для родителя."""
+    bot = sys.modules["bot"]
+    post_shutdown = bot.post_shutdown
+
+    async def check_and_shutdown(app):
+        # Очередь обработчика пуста и дописана — ждём остальные процессы, потом каждый должен увидеть чужие голоса
+        contest = bot.CONTESTS.default
+        await asyncio.to_thread(barrier.wait, 60)
+        contest._synced = float("-inf")
+        contest.sync()
+        # Обработчика приложения ошибок у обработчика нет — берём счётчик хендлеров
+        errors = Counter({dict(labels)["handler"]: n for (name, labels), n in bot.METRICS.counters.items()
+                          if name == "oscar_handler_errors_total"})
+        part = dict(worker_stats(bot), seen=(len(contest.store.ballots), contest.store.check()), errors=errors)
+        await post_shutdown(app)
+        out.put((index, part))
+
+    bot.post_shutdown = check_and_shutdown
+    run_worker(token, index, queue)
+
+def build(bot, args):
+    """(приложение, откуда взять сводки обработчиков): распределитель с --workers процессами или один бот."""
+    if args.workers == 1:
+        bot.CONTESTS.default
+        bot.SESSIONS.open()
+        return bot.build_app(TOKEN), None
+    # build_front запускает обработчики сам; подменяем только цель процесса, чтобы получить их сводки
+    out = multiprocessing.Queue()
+    bot.run_worker = functools.partial(serve_worker, bot.run_worker, multiprocessing.Barrier(args.workers), out)
+    return bot.build_front(TOKEN), out
+
+async def drive(bot, app, args):
+    """Прогоняет всех участников через app — бота или распределитель — и останавливает его."""
+    r = Run(bot, app, args)
+    app.add_error_handler(r.on_error)
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+    secret = None
+    if args.webhook:
+        await r.start_webhook()
+        secret = await r.check_secret()
+
+    done    = asyncio.Event()
+    abusers = [asyncio.create_task(r.abuser(uid, done)) for uid in range(2_000_000, 2_000_000 + args.abusers)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(r.participant(uid, rng) for uid, rng in participants(args)))
+    done.set()
+    await asyncio.gather(*abusers)
+
+    if args.webhook:
+        await r.stop_webhook()
+        secret["leaked"] = secret.pop("update_id") in r.handled
+    await app.stop()
+    # У распределителя здесь обработчики доделывают очереди и завершаются
+    await app.post_shutdown(app)
+    wall = time.perf_counter() - t0
+    await app.shutdown()
+    return {"latency": dict(r.latency), "errors": r.errors, "expect": r.expect,
+            "wall": wall, "secret": secret}
+
+def set_deadline(bot):
+    # Конкурс здесь не загружаем: процессы-обработчики должны открыть его сами
+    cid   = bot.DEFAULT_CONTEST
+    store = bot.make_store(cid, bot.load(bot.CONTESTS.path(cid))["categories"])
+    store.open()
+    deadline = datetime.now(timezone.utc) + timedelta(days=1)
+    store.commit([("config", {"deadline_utc": deadline.isoformat()})])
+    store.close()
+
+def run(args, workdir):
+    stub, url = start_stub(args.rtt / 1000)
+    bot = configure(args, workdir, url)
+    set_deadline(bot)
+    app, out = build(bot, args)
+    res = asyncio.run(drive(bot, app, args))
+    # Обработчики к этому моменту уже завершились — их сводки лежат в очереди
+    parts = [part for _, part in sorted(out.get() for _ in range(args.workers))] if out else \
+            [dict(worker_stats(bot), seen=None)]
+    calls = stub_calls(url)
+    stub.terminate()
+
+    r = Run(bot, None, args)
+    r.latency, r.errors, r.expect = res["latency"], res["errors"], res["expect"]
+    for part in parts:
+        r.errors.update(part.get("errors", {}))
+    wall = res["wall"]
+
+    total = sum(len(v) for label, v in r.latency.items() if label != "abuse")
+    print(f"участников {args.users}, обновлений {total} за {wall:.2f} с — {total / wall:.0f} обновл./с")
+    print(f"хранилище {args.storage}, процессов {args.workers}, задержка Bot API {args.rtt:g} мс, "
+          f"вызовов Bot API {sum(calls.values())}")
+    if args.workers > 1:
+        print("задержка — до передачи обновления в очередь обработчика")
+    print(f"\n{'хендлер':12} {'n':>7} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'max мс':>8}")
+    for label, xs in sorted(r.latency.items(), key=lambda kv: -len(kv[1])):
+        xs.sort()
+        print(f"{label:12} {len(xs):7} {pct(xs, .5):8.1f} {pct(xs, .95):8.1f} "
+              f"{pct(xs, .99):8.1f} {xs[-1] * 1000:8.1f}")
+    print()
+    for i, part in enumerate(parts):
+        writer = part["writer"]
+        print(f"запись{f' [{i}]' if len(parts) > 1 else ''}: {writer['written']} изменений "
+              f"за {writer['commits']} записей, очередь до {writer['max_depth']}, "
+              f"подтверждение в среднем {writer['avg_ms']:.1f} мс")
+    if args.abusers:
+        print(f"флуд: {args.abusers} скриптов, отброшено {sum(p['flood']['throttled'] for p in parts)}, "
+              f"повторных нажатий погашено {sum(p['flood']['debounced'] for p in parts)}")
+    if r.errors:
+        print("ошибки в хендлерах:", dict(r.errors))
+    unanswered = []
+    if args.webhook:
+        # Каждая кнопка — answerCallbackQuery, каждая команда — хотя бы одно сообщение
+        taps  = sum(len(xs) for label, xs in r.latency.items() if not label.startswith("/") and label != "abuse")
+        cmds  = sum(len(xs) for label, xs in r.latency.items() if label.startswith("/"))
+        unanswered = [m for m, n in (("answerCallbackQuery", taps), ("sendMessage", cmds))
+                      if calls.get(m, 0) < n]
+        codes, leaked = res["secret"]["codes"], res["secret"]["leaked"]
+        print(f"webhook: чужой секрет и без секрета — {codes}"
+              + (", обновление дошло до хендлеров" if leaked else ""))
+        if codes != [403, 403] or leaked:
+            unanswered.append("secret")
+        print(f"ответы Bot API: answerCallbackQuery {calls.get('answerCallbackQuery', 0)} на {taps} нажатий, "
+              f"sendMessage {calls.get('sendMessage', 0)} на {cmds} команд")
+
+    lost, bad, extra, mismatch = r.verify()
+    print(f"проверка с диска: потеряно {lost}, испорчено {bad}, лишних {extra}"
+          + (f", счётчики разошлись: {mismatch}" if mismatch else ""))
+    # Каждый процесс после синхронизации должен видеть все бюллетени и сходиться со счётчиками
+    stale = [i for i, part in enumerate(parts)
+             if part["seen"] and (part["seen"][0] != len(r.expect) or part["seen"][1])]
+    if args.workers > 1:
+        print(f"синхронизация: процессов с неполной картиной {len(stale)}"
+              + (f" ({stale})" if stale else ""))
+    return 1 if lost or bad or extra or mismatch or stale or r.errors or unanswered else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users",   type=int,   default=1000)
+    ap.add_argument("--rtt",     type=float, default=20, help="задержка ответа заглушки Bot API, мс")
+    ap.add_argument("--revote",  type=float, default=0.1, help="доля участников, голосующих повторно")
+    ap.add_argument("--back",    type=float, default=0.05, help="вероятность нажать ← Назад на шаге")
+    ap.add_argument("--storage", choices=("json", "journal", "sqlite"), default="json")
+    ap.add_argument("--workers", type=int,   default=1, help="процессов с общей базой (только sqlite)")
+    ap.add_argument("--abusers", type=int,   default=0, help="скриптов, заваливающих бота обновлениями")
+    ap.add_argument("--webhook", action="store_true", help="слать обновления POST-запросами на webhook бота")
+    ap.add_argument("--seed",    type=int,   default=1)
+    ap.add_argument("--keep",    action="store_true", help="не удалять каталог с данными")
+    args = ap.parse_args()
+    if args.workers > 1 and args.storage != "sqlite":
+        ap.error("--workers работает только с --storage sqlite")
+
+    workdir = tempfile.mkdtemp(prefix="oscar-load-")
+    try:
+        code = run(args, workdir)
+    finally:
+        if args.keep:
+            print("данные:", workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(code)
+
+if __name__ == "__main__":
+    main()